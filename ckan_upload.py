@@ -6,13 +6,16 @@ import glob
 import re
 
 from utils.ckan_client import CKANClient
-from utils.ckan_utils import clean_keywords, generate_valid_ckan_id
+from utils.ckan_utils import clean_keywords, generate_valid_ckan_id, split_data_extension, split_dataset_index
 from utils.helpers import normalize_url
+from utils.output_formats import open_binary
 
 DATASETS_PATH = "extracted_datasets"
+DATA_EXTENSIONS = (".csv", ".csv.gz", ".csv.zst", ".parquet")
 
 def detect_encoding(file_path):
-    with open(file_path, 'rb') as f:
+    # .gz / .zst files are decompressed on the fly
+    with open_binary(file_path) as f:
         raw = f.read(4)
         if raw.startswith(b'\xef\xbb\xbf'):
             return 'utf-8-sig'
@@ -57,7 +60,7 @@ def load_json_metadata(org_name, dataset_name):
         return json.load(f)
 
 def extract_csv_metadata(file_path, org_name):
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    base_name, dataset_index = split_dataset_index(split_data_extension(file_path)[0])
     metadata_json = load_json_metadata(org_name, base_name)
 
     url = ""
@@ -81,7 +84,13 @@ def extract_csv_metadata(file_path, org_name):
                 print(f"🔎 CSV Headers: {reader.fieldnames}")
                 for row in reader:
                     version_name = row.get('Version Name', '').strip()
-                    if base_name.lower() in version_name.lower():
+                    # Names repeat across datasets; the index in the file name picks the right row
+                    if dataset_index:
+                        matched = (f"/{dataset_index}/" in row.get('Data Link', '') or
+                                   f"index={dataset_index}" in row.get('Data Url', ''))
+                    else:
+                        matched = base_name.lower() in version_name.lower()
+                    if matched:
                         url = row.get('Data Url', '')
                         meta_link = row.get('Meta Link', '')
                         print(f"✅ Found match: {version_name}")
@@ -125,12 +134,12 @@ def process_organization(client, org_name):
         print(f"❌ No dataset directory found for {org_name}")
         return False
 
-    csv_files = [f for f in os.listdir(org_path) if f.endswith(".csv")]
-    if not csv_files:
-        print(f"⚠️ No CSV files found in {org_path}")
+    data_files = [f for f in os.listdir(org_path) if f.endswith(DATA_EXTENSIONS)]
+    if not data_files:
+        print(f"⚠️ No CSV or Parquet files found in {org_path}")
         return False
 
-    for file in csv_files:
+    for file in data_files:
         file_path = os.path.join(org_path, file)
         print(f"\n📄 Processing: {file}")
 
@@ -194,9 +203,9 @@ def main():
             if org_selection.isdigit() and 0 < int(org_selection) <= len(orgs):
                 org_name = orgs[int(org_selection) - 1]
                 sample_files = os.listdir(os.path.join(DATASETS_PATH, org_name))
-                sample_csv = next((f for f in sample_files if f.endswith('.csv')), None)
+                sample_csv = next((f for f in sample_files if f.endswith(DATA_EXTENSIONS)), None)
                 if sample_csv:
-                    dataset_name = os.path.splitext(sample_csv)[0]
+                    dataset_name = split_dataset_index(split_data_extension(sample_csv)[0])[0]
                     metadata = load_metadata_from_json(org_name, dataset_name)
                     owner_org_name = metadata.get("owner_org_name", org_name) if metadata else org_name
                     owner_org_id = client.get_or_create_organization(owner_org_name)
@@ -206,7 +215,7 @@ def main():
                     else:
                         print("Deletion cancelled.")
                 else:
-                    print("❌ No CSV files found.")
+                    print("❌ No CSV or Parquet files found.")
             else:
                 print("Invalid selection.")
             continue
@@ -35,4 +35,41 @@ CKAN_HEADERS = {
 
 CGO_DATASOURCE = "datasources/getstatisticsbycgogovagencies.json"
 MIO_DATASOURCE = "datasources/getstatisticsbymiogovagencies.json"
-QUASIORG_DATASOURCE = "datasources/getstatisticsbyquasiorganizations.json"
\ No newline at end of file
+QUASIORG_DATASOURCE = "datasources/getstatisticsbyquasiorganizations.json"
+
+# Browser crawl settings
+CHROME_HEADLESS = True
+DRIVER_MAX_PAGES = 300  # recycle Chrome after this many page loads
+DRIVER_MAX_MEMORY_MB = 1500  # recycle Chrome once its process tree grows past this
+CHROME_LEAN = True  # skip images, fonts, stylesheets and analytics, don't wait for the load event
+CHROME_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.css",
+    "*google-analytics.com*", "*googletagmanager.com*", "*mc.yandex.ru*", "*doubleclick.net*",
+]
+
+# Politeness delay between crawl requests, adapted at runtime within [MIN, MAX]
+CRAWL_DELAY_SECONDS = 0.5
+CRAWL_DELAY_MIN = 0.1
+CRAWL_DELAY_MAX = 30
+
+# Extraction: requests per second per host across all worker threads (0 = unlimited)
+API_RATE_LIMIT = 10
+
+# Shared HTTP client: retries on timeouts and 429/5xx with jittered exponential backoff
+HTTP_MAX_RETRIES = 4
+HTTP_BACKOFF_BASE = 1.0
+HTTP_BACKOFF_MAX = 60
+HTTP_POOL_SIZE = 32
+
+# On-disk HTTP cache for API data and meta JSON (--cache on|offline)
+HTTP_CACHE_DIR = "data/http_cache"
+HTTP_CACHE_TTL = 24 * 3600
+HTTP_CACHE_MAX_MB = 2048
+
+# Extraction planning (--plan): record-count probes and download mode by dataset size
+SIZE_PROBE_WORKERS = 8
+SIZE_PROBE_MAX_AGE = 7 * 24 * 3600
+PAGED_DOWNLOAD_ROWS = 50_000
+PARTITIONED_DOWNLOAD_ROWS = 500_000
+PLAN_WINDOW_CONCURRENCY = 4
@@ -7,23 +7,103 @@ from datetime import datetime
 from pathlib import Path
 from tqdm import tqdm
 import csv
-
-from utils.api_utils import fetch_api_data
+import json
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import (
+    PAGED_DOWNLOAD_ROWS, PARTITIONED_DOWNLOAD_ROWS, PLAN_WINDOW_CONCURRENCY, SIZE_PROBE_MAX_AGE, SIZE_PROBE_WORKERS
+)
+from utils.api_utils import (
+    DEFAULT_PAGE_SIZE, fetch_api_data, fetch_api_data_paged, fetch_api_data_partitioned, has_data_columns,
+    probe_total_records
+)
+from utils.async_extraction import ASYNC_AVAILABLE, run_async_extraction
+from utils.error_ledger import (
+    LEDGER_FIELDS, compact_ledger, is_retryable, latest_failures, ledger_key, read_ledger
+)
+from utils.extraction_manifest import ExtractionManifest, SizeManifest
+from utils.http_cache import CACHE_MODES
+from utils.http_session import configure_cache, get_http_client
+from utils.link_resolver import parse_data_link
+from utils.output_formats import (
+    COMPRESSIONS, DEFAULT_ROW_GROUP_SIZE, OUTPUT_FORMATS, PARQUET_AVAILABLE, ZSTD_AVAILABLE,
+    dataset_extension, dataset_stem, open_dataset_writer
+)
+from utils.rate_limit import get_rate_limiter
+from utils.row_delta import DeltaWriter, RowDeltaTracker
 
 
 class DatasetExtractor:
-    def __init__(self):
+    def __init__(self, page_size=None, window_concurrency=1, workers=1, rate_limit=None,
+                 engine='threads', concurrency=100, force=False,
+                 denormalize=False, output_format='csv', row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                 cache_mode='off', cache_ttl=None, plan=False, delta=False, compression='none', verify=False):
+        # With a page size, datasets are fetched in from/size windows and streamed to disk;
+        # with window concurrency, those windows are downloaded in parallel
+        self.window_concurrency = window_concurrency
+        self.page_size = page_size or (DEFAULT_PAGE_SIZE if window_concurrency > 1 else None)
+        self.workers = workers
+        # 'async' keeps up to `concurrency` requests in flight on a single event loop
+        if engine == 'async' and not ASYNC_AVAILABLE:
+            logging.warning("httpx is not installed, falling back to the thread engine")
+            engine = 'threads'
+        # The asyncio engine talks to httpx directly, so cached runs go through the threads
+        if engine == 'async' and cache_mode != 'off':
+            logging.warning("The HTTP cache is not used by the async engine, falling back to the thread engine")
+            engine = 'threads'
+        self.engine = engine
+        if cache_mode != 'off':
+            configure_cache(cache_mode, **({'ttl': cache_ttl} if cache_ttl is not None else {}))
+        self.concurrency = concurrency
+        if rate_limit is not None:
+            get_rate_limiter().set_rate(rate_limit)
+        self.error_lock = threading.Lock()
+        # Jobs sharing an output file (the same dataset listed twice) have their writes serialized
+        self.path_locks = {}
+        self.path_locks_lock = threading.Lock()
         self.output_dir = Path('extracted_datasets')
         self.output_dir.mkdir(exist_ok=True)
         self.error_log = self.output_dir / 'extraction_errors.csv'
+        # Datasets whose version and file are unchanged since the last run are skipped unless forced
+        self.force = force
+        # verify re-hashes every file instead of trusting an unchanged size and mtime
+        self.verify = verify
+        self.manifest = ExtractionManifest(self.output_dir / 'manifest.json')
+        # (agency dir, Version Name) -> dataset index whose file uses the plain name
+        self.name_owners = {}
+        for index, entry in self.manifest.entries.items():
+            if entry.get('path'):
+                path = Path(entry['path'])
+                self.name_owners.setdefault((path.parent.name, dataset_stem(path.name)), index)
+        # With plan, record counts are probed up front to order jobs and pick the download mode
+        self.plan = plan
+        self.sizes = SizeManifest(self.output_dir / 'sizes.json')
+        # With delta, row fingerprints are kept per dataset and each new version's changes written out
+        self.delta = delta
+        self.fingerprint_db = self.output_dir / 'fingerprints.sqlite'
+        # Metadata goes to a <name>.meta.json sidecar; denormalize also repeats it in every row
+        self.denormalize = denormalize
+        if output_format == 'parquet' and not PARQUET_AVAILABLE:
+            logging.warning("pyarrow is not installed, writing CSV instead of Parquet")
+            output_format = 'csv'
+        self.output_format = output_format
+        self.row_group_size = row_group_size
+        # CSV files are compressed while they are written; Parquet pages are compressed already
+        if compression == 'zstd' and not ZSTD_AVAILABLE:
+            logging.warning("zstandard is not installed, compressing with gzip instead of zstd")
+            compression = 'gzip'
+        self.compression = compression if output_format == 'csv' else 'none'
         self.setup_logging()
 
         # Initialize error log if it doesn't exist
         if not self.error_log.exists():
             with open(self.error_log, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=[
-                    'timestamp', 'agency', 'url', 'dataset_name', 'error_type', 'error_message', 'status_code'
-                ])
+                writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS)
                 writer.writeheader()
 
     def setup_logging(self):
@@ -47,12 +127,56 @@ class DatasetExtractor:
         """Create safe directory names for agencies."""
         return self.sanitize_filename(name).lower()
 
+    def output_name(self, url, dataset_name, agency_name):
+        """
+        File stem of a dataset: its Version Name.
+
+        Names repeat across datasets; when a different dataset index already owns the name
+        in this agency directory (last run's manifest or earlier in this run), the index
+        is appended as <name>__<index> so the two don't overwrite each other.
+        """
+        index, _ = parse_data_link(url) if isinstance(url, str) else (None, None)
+        if index is None:
+            return dataset_name
+        with self.path_locks_lock:
+            owner = self.name_owners.setdefault((self.sanitize_agency_name(agency_name), dataset_name), index)
+        return dataset_name if owner == index else f"{dataset_name}__{index}"
+
+    def dataset_path(self, url, dataset_name, agency_name):
+        extension = dataset_extension(self.output_format, self.compression)
+        return self.output_dir / self.sanitize_agency_name(agency_name) / f"{self.output_name(url, dataset_name, agency_name)}{extension}"
+
+    def path_lock(self, filepath):
+        with self.path_locks_lock:
+            return self.path_locks.setdefault(str(filepath), threading.Lock())
+
+    def write_sidecar(self, result, url, dataset_name, agency_name, rows):
+        """Write the dataset-level metadata once, next to the data file."""
+        filepath = self.dataset_path(url, dataset_name, agency_name)
+        sidecar = {**(result.get('metadata') or {}), 'records': rows, 'data_file': filepath.name}
+        with open(filepath.parent / f"{dataset_stem(filepath.name)}.meta.json", 'w', encoding='utf-8') as f:
+            json.dump(sidecar, f, indent=2, ensure_ascii=False)
+
+    def is_unchanged(self, url, dataset_name, agency_name):
+        """True when the manifest has this dataset at the Data Link's version with an intact file."""
+        if self.force or not isinstance(url, str):
+            return False
+        index, version = parse_data_link(url)
+        if index is None:
+            return False
+        return self.manifest.is_current(index, version, self.dataset_path(url, dataset_name, agency_name),
+                                        verify=self.verify)
+
+    def record_extraction(self, url, dataset_name, agency_name, rows):
+        index, version = parse_data_link(url)
+        if index is not None:
+            self.manifest.record(index, version, self.dataset_path(url, dataset_name, agency_name), rows,
+                                 agency=agency_name, dataset_name=dataset_name)
+
     def log_error(self, agency, url, dataset_name, error_type, error_msg, status_code=None):
         """Log errors to CSV file."""
-        with open(self.error_log, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=[
-                'timestamp', 'agency', 'url', 'dataset_name', 'error_type', 'error_message', 'status_code'
-            ])
+        with self.error_lock, open(self.error_log, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS)
             writer.writerow({
                 'timestamp': datetime.now().isoformat(),
                 'agency': agency,
@@ -63,44 +187,444 @@ class DatasetExtractor:
                 'status_code': status_code
             })
 
-    def save_dataset(self, data, dataset_name, agency_name):
+    def open_writer(self, url, filepath, dataset_name):
+        """Streaming writer for a dataset file, tracking row deltas in delta mode."""
+        writer = open_dataset_writer(filepath, self.output_format, self.row_group_size, self.compression)
+        index, version = parse_data_link(url) if self.delta and isinstance(url, str) else (None, None)
+        if index is None:
+            return writer
+        tracker = RowDeltaTracker(
+            self.fingerprint_db, index, version, filepath.parent / f"{dataset_stem(filepath.name)}.delta",
+            self.output_format, self.row_group_size, self.compression
+        )
+        return DeltaWriter(writer, tracker)
+
+    def save_dataset(self, data, dataset_name, agency_name, url=None):
         """Save dataset using the name from source CSV."""
-        try:
-            # Create filename from source dataset name
-            #safe_name = self.sanitize_filename(dataset_name)
-            filename = f"{dataset_name}.csv"
-            agency_dir = self.output_dir / self.sanitize_agency_name(agency_name)
-            agency_dir.mkdir(exist_ok=True)
-            filepath = agency_dir / filename
-
-            # Convert data to DataFrame
-            if isinstance(data, dict):
-                df = pd.DataFrame([data])
-            elif isinstance(data, list):
-                df = pd.DataFrame(data)
-            else:
-                logging.error(f"Unsupported data type: {type(data)}")
+        writer = None
+        # Create filename from source dataset name and index
+        filepath = self.dataset_path(url, dataset_name, agency_name)
+        with self.path_lock(filepath):
+            try:
+                filepath.parent.mkdir(exist_ok=True)
+
+                if isinstance(data, dict):
+                    data = [data]
+                elif not isinstance(data, list):
+                    logging.error(f"Unsupported data type: {type(data)}")
+                    return False
+
+                # Rows are written as they are read, columns are collected on the way
+                writer = self.open_writer(url, filepath, dataset_name)
+                writer.write_rows(data)
+
+                # Check if the dataset contains actual data
+                if writer.rows == 0 or not has_data_columns(writer.columns):
+                    writer.abort()
+                    logging.warning(f"Skipping empty dataset: {dataset_name}")
+                    return False
+
+                writer.close()
+                logging.info(f"Saved dataset to {filepath}")
+                return True
+
+            except Exception as e:
+                if writer is not None:
+                    writer.abort()
+                logging.error(f"Failed to save dataset {dataset_name}: {str(e)}")
                 return False
 
-            # Check if DataFrame contains actual data
-            if len(df) == 0 or all(col.startswith(('version_', 'api_', 'extraction_')) for col in df.columns):
-                logging.warning(f"Skipping empty dataset: {dataset_name}")
-                return False
 
-            # Save to CSVinfo
-            df.to_csv(
-                filepath,
-                index=False,
-                encoding='utf-8-sig',
-                quoting=csv.QUOTE_NONNUMERIC
+    def known_size(self, url):
+        """Record count of this dataset version from the planning probe or the last extraction, or None."""
+        if not isinstance(url, str):
+            return None
+        index, version = parse_data_link(url)
+        if index is None:
+            return None
+        records = self.sizes.records(index, version)
+        if records is None:
+            entry = self.manifest.get(index)
+            if entry and entry.get('version') == version:
+                records = entry.get('rows')
+        return records
+
+    def download_mode(self, url):
+        """
+        'single', 'paged' or 'partitioned' for one dataset.
+
+        An explicit --page-size / --window-concurrency applies to every dataset; otherwise
+        known sizes decide, and datasets of unknown size are fetched in one request.
+        """
+        if self.page_size:
+            return 'partitioned' if self.window_concurrency > 1 else 'paged'
+        size = self.known_size(url)
+        if size is None or size < PAGED_DOWNLOAD_ROWS:
+            return 'single'
+        return 'partitioned' if size >= PARTITIONED_DOWNLOAD_ROWS else 'paged'
+
+    def plan_sizes(self, jobs):
+        """
+        Probe the record count of every job whose size isn't known yet and store it in sizes.json.
+
+        Unchanged datasets are not probed. A previous count of the dataset is passed as a
+        hint, so re-probing a dataset that didn't grow costs three one-record requests.
+        """
+        to_probe = {}
+        for url, dataset_name, agency_name in jobs:
+            if not isinstance(url, str) or not url.startswith('http'):
+                continue
+            index, version = parse_data_link(url)
+            if index is None or index in to_probe:
+                continue
+            if self.sizes.records(index, version, max_age=SIZE_PROBE_MAX_AGE) is not None:
+                continue
+            if self.is_unchanged(url, dataset_name, agency_name):
+                continue
+            to_probe[index] = (url, version)
+        if not to_probe:
+            return
+
+        def probe(index, url, version):
+            total, _ = probe_total_records(url, hint=self.sizes.hint(index))
+            if total is not None:
+                self.sizes.record_size(index, version, total)
+            return total
+
+        with tqdm(total=len(to_probe), desc="Probing sizes") as pbar, \
+                ThreadPoolExecutor(max_workers=SIZE_PROBE_WORKERS, thread_name_prefix="probe") as executor:
+            futures = [executor.submit(probe, index, url, version) for index, (url, version) in to_probe.items()]
+            for future in as_completed(futures):
+                pbar.update(1)
+        self.sizes.save()
+
+    def stream_dataset(self, url, dataset_name, agency_name, partitioned=None):
+        """
+        Fetch a dataset page by page and write it to CSV or Parquet without holding it in memory.
+
+        Each page goes straight to a streaming writer that discovers the columns as they
+        appear, so memory stays at one page of records. partitioned downloads the windows
+        in parallel. Returns the fetch result; 'saved' tells whether a file was written.
+        """
+        page_size = self.page_size or DEFAULT_PAGE_SIZE
+        if partitioned is None:
+            partitioned = self.window_concurrency > 1
+        window_concurrency = self.window_concurrency if self.window_concurrency > 1 else PLAN_WINDOW_CONCURRENCY
+        filepath = self.dataset_path(url, dataset_name, agency_name)
+        agency_dir = filepath.parent
+        agency_dir.mkdir(exist_ok=True)
+        work_dir = agency_dir / f".{dataset_stem(filepath.name)}.windows"
+        with self.path_lock(filepath):
+            writer = None
+            try:
+                writer = self.open_writer(url, filepath, dataset_name)
+                if partitioned:
+                    # A fresh count from --plan saves the size probe; an older one speeds it up
+                    index, version = parse_data_link(url) if isinstance(url, str) else (None, None)
+                    result = fetch_api_data_partitioned(
+                        url, writer.write_rows, work_dir=work_dir,
+                        page_size=page_size, concurrency=window_concurrency,
+                        denormalize=self.denormalize,
+                        total=self.sizes.records(index, version, max_age=SIZE_PROBE_MAX_AGE) if index else None,
+                        size_hint=(self.sizes.hint(index) or self.known_size(url)) if index else None
+                    )
+                else:
+                    result = fetch_api_data_paged(url, writer.write_rows, page_size=page_size,
+                                                  denormalize=self.denormalize)
+
+                result['saved'] = False
+                if result['status'] != 'success':
+                    return result
+
+                if not has_data_columns(writer.columns):
+                    logging.warning(f"Skipping empty dataset: {dataset_name}")
+                    return result
+
+                writer.close()
+                writer = None
+
+                logging.info(f"Saved dataset to {filepath} ({result['records']} records, {result['pages']} pages)")
+                result['saved'] = True
+                return result
+
+            except Exception as e:
+                logging.error(f"Failed to stream dataset {dataset_name}: {str(e)}")
+                return {'status': 'success', 'saved': False, 'is_empty': False}
+            finally:
+                if writer is not None:
+                    writer.abort()
+                if work_dir.exists() and not any(work_dir.iterdir()):
+                    work_dir.rmdir()
+
+    def process_dataset(self, url, dataset_name, agency_name):
+        """Fetch and save one dataset; returns the stats key of the outcome."""
+        # Skip invalid URLs
+        if pd.isna(url) or not str(url).startswith('http'):
+            self.log_error(
+                agency_name, str(url), dataset_name,
+                'invalid_url', 'Missing or invalid URL'
             )
-            logging.info(f"Saved dataset to {filepath}")
-            return True
-
+            return 'invalid_url'
+
+        if self.is_unchanged(url, dataset_name, agency_name):
+            return 'skipped'
+
+        # Fetch API data
+        mode = self.download_mode(url)
+        if mode != 'single':
+            result = self.stream_dataset(url, dataset_name, agency_name, partitioned=mode == 'partitioned')
+        else:
+            result = fetch_api_data(url, denormalize=self.denormalize)
+
+        return self.handle_result(result, url, dataset_name, agency_name)
+
+    def handle_result(self, result, url, dataset_name, agency_name):
+        """Log a failed fetch result or save a successful one; returns the stats key of the outcome."""
+        # Skip empty/invalid responses
+        if result.get('is_empty', False):
+            self.log_error(
+                agency_name, url, dataset_name,
+                'empty_response',
+                result.get('error', 'Empty response'),
+                result.get('status_code')
+            )
+            return 'empty_response'
+
+        # Offline runs can only report datasets missing from the HTTP cache
+        if result.get('offline_miss'):
+            self.log_error(agency_name, url, dataset_name, 'offline_miss', result['error'])
+            return 'offline_miss'
+
+        # Handle API errors
+        if result['status'] != 'success':
+            self.log_error(
+                agency_name, url, dataset_name,
+                'api_error',
+                result.get('error', 'Unknown API error'),
+                result.get('status_code')
+            )
+            return 'api_error'
+
+        # Save dataset using name from source CSV; streamed datasets are already on disk
+        if 'saved' in result:
+            saved = result['saved']
+        else:
+            saved = self.save_dataset(result['data'], dataset_name, agency_name, url=url)
+        if not saved:
+            self.log_error(
+                agency_name, url, dataset_name,
+                'save_failed', 'Failed to save dataset'
+            )
+            return 'save_failed'
+
+        if 'records' in result:
+            rows = result['records']
+        else:
+            rows = len(result['data']) if isinstance(result['data'], list) else 1
+        self.write_sidecar(result, url, dataset_name, agency_name, rows)
+        self.record_extraction(url, dataset_name, agency_name, rows)
+        return 'success'
+
+    def job_failed(self, url, dataset_name, agency_name, error):
+        """Log an exception that escaped a job to the error ledger; returns its outcome."""
+        logging.error(f"Unexpected error extracting {dataset_name}: {error.__class__.__name__}: {error}",
+                      exc_info=error)
+        self.log_error(agency_name, str(url), dataset_name, 'unexpected_error',
+                       f"{error.__class__.__name__}: {error}")
+        return 'unexpected_error'
+
+    def run_job(self, url, dataset_name, agency_name):
+        """process_dataset for the job runners: an unexpected exception fails only this job."""
+        try:
+            return self.process_dataset(url, dataset_name, agency_name)
         except Exception as e:
-            logging.error(f"Failed to save dataset {dataset_name}: {str(e)}")
-            return False
-
+            return self.job_failed(url, dataset_name, agency_name, e)
+
+    def new_stats(self):
+        return {
+            'total': 0,
+            'success': 0,
+            'invalid_url': 0,
+            'api_error': 0,
+            'empty_response': 0,
+            'save_failed': 0,
+            'offline_miss': 0,
+            'unexpected_error': 0,
+            'skipped': 0
+        }
+
+    def run_jobs(self, jobs, desc):
+        """
+        Extract (url, dataset_name, agency_name) jobs with the configured engine.
+
+        Returns (url, dataset_name, agency_name, outcome) for every job. Jobs of several
+        agencies share the one worker pool and rate limit. A job that raises is logged to
+        the error ledger as 'unexpected_error' instead of stopping the others.
+        """
+        results = []
+        # Names are claimed in job order, so which of two same-named datasets keeps the plain
+        # file name doesn't depend on thread timing
+        for url, dataset_name, agency_name in jobs:
+            self.output_name(url, dataset_name, agency_name)
+        # Outcomes are collected on this thread only, so the progress bar needs no lock
+        with tqdm(total=len(jobs), desc=desc) as pbar:
+            if self.engine == 'async':
+                results = run_async_extraction(self, jobs, self.concurrency, pbar)
+            elif self.workers > 1:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="extract") as executor:
+                    futures = {executor.submit(self.run_job, *job): job for job in jobs}
+                    for future in as_completed(futures):
+                        results.append((*futures[future], future.result()))
+                        pbar.update(1)
+            else:
+                for job in jobs:
+                    results.append((*job, self.run_job(*job)))
+                    pbar.update(1)
+        return results
+
+    def resolve_errors(self, keys):
+        """
+        Compact the error ledger at the end of a run: drop datasets that have been extracted
+        since and keep only the latest failure of the rest, so failures logged again on
+        every run (invalid links, 404s, empty datasets) don't grow it without limit.
+        """
+        keys = set(keys)
+        with self.error_lock:
+            rows = read_ledger(self.error_log)
+            latest = latest_failures(rows)
+            if len(rows) > len(latest) or keys & set(latest):
+                kept = compact_ledger(self.error_log, keys)
+                logging.info(f"Error ledger compacted, {kept} unresolved failures left")
+
+    def retry_failed(self, rounds=3, backoff=30):
+        """
+        Re-extract only the datasets the error ledger says failed last time.
+
+        Retryable failures (API errors, timeouts, save failures) are attempted up to
+        `rounds` times with jittered exponential backoff between rounds; 404s, invalid
+        links and empty datasets are left alone. Datasets that succeed are removed from
+        the ledger. Returns the stats of the last attempt of every dataset.
+        """
+        failures = latest_failures(read_ledger(self.error_log))
+        pending = {key: row for key, row in failures.items() if is_retryable(row)}
+        logging.info(f"{len(failures)} datasets in the error ledger, {len(pending)} worth retrying")
+
+        outcomes = {}
+        for round_number in range(rounds):
+            if not pending:
+                break
+            if round_number:
+                delay = random.uniform(0.5, 1.5) * backoff * 2 ** (round_number - 1)
+                logging.info(f"Retry round {round_number + 1} for {len(pending)} datasets in {delay:.0f}s")
+                time.sleep(delay)
+
+            jobs = [(url, dataset_name, agency) for agency, url, dataset_name in pending]
+            resolved = []
+            for url, dataset_name, agency, outcome in self.run_jobs(jobs, f"Retry round {round_number + 1}"):
+                key = ledger_key(agency, url, dataset_name)
+                outcomes[key] = outcome
+                if outcome in ('success', 'skipped'):
+                    resolved.append(key)
+                    pending.pop(key, None)
+                else:
+                    # A failure can turn permanent (e.g. a 404) between rounds
+                    latest = latest_failures(read_ledger(self.error_log)).get(key)
+                    if latest is not None and not is_retryable(latest):
+                        pending.pop(key, None)
+            self.resolve_errors(resolved)
+        self.manifest.save()
+
+        stats = self.new_stats()
+        for outcome in outcomes.values():
+            stats['total'] += 1
+            stats[outcome] += 1
+        logging.info("Retry summary:")
+        for stat, count in stats.items():
+            logging.info(f"  {stat.replace('_', ' ').title()}: {count}")
+        logging.info(f"  Still failing: {len(pending)}")
+        return stats
+
+    def job_priority(self, job, failures):
+        """
+        Sort key for the batch scheduler: datasets that failed last time first, then new
+        or stale ones, then ones that keep failing for good, then unchanged ones; the
+        largest known (probed or last extracted) datasets first within each tier.
+        """
+        url, dataset_name, agency_name = job
+        index, version = parse_data_link(url) if isinstance(url, str) else (None, None)
+        entry = self.manifest.get(index) if index else None
+        rows = self.known_size(url) or 0
+
+        failure = failures.get(ledger_key(agency_name, url, dataset_name))
+        if failure is not None:
+            tier = 0 if is_retryable(failure) else 2
+        elif entry is None or entry.get('version') != version:
+            tier = 1
+        else:
+            tier = 3
+        return tier, -rows
+
+    def load_jobs(self, input_csv, agency_name):
+        df = pd.read_csv(input_csv)
+        required_columns = {'Data Link', 'Version Name'}
+        if not required_columns.issubset(df.columns):
+            raise ValueError(f"{input_csv} is missing columns: {required_columns - set(df.columns)}")
+        return [(row['Data Link'], row['Version Name'], agency_name) for _, row in df.iterrows()]
+
+    def run_batch(self, sources, summary_path=None):
+        """
+        Extract every agency group in one prioritized queue and return a summary dict.
+
+        All groups share the worker pool (or async concurrency) and the rate limit. The
+        summary holds stats per group and in total and is also written as JSON to
+        summary_path (extracted_datasets/batch_summary.json by default).
+        """
+        started = datetime.now()
+        failures = latest_failures(read_ledger(self.error_log))
+        jobs = []
+        groups = {}
+        for agency_name, input_csv in sources.items():
+            groups[agency_name] = self.new_stats()
+            if not Path(input_csv).exists():
+                logging.error(f"Input file not found: {input_csv}")
+                groups[agency_name]['missing_input'] = 1
+                continue
+            jobs.extend(self.load_jobs(input_csv, agency_name))
+        if self.plan:
+            self.plan_sizes(jobs)
+        jobs.sort(key=lambda job: self.job_priority(job, failures))
+        logging.info(f"Batch of {len(jobs)} datasets from {len(sources)} groups")
+
+        totals = self.new_stats()
+        resolved = []
+        completed = False
+        try:
+            for url, dataset_name, agency_name, outcome in self.run_jobs(jobs, "Batch"):
+                for stats in (totals, groups[agency_name]):
+                    stats['total'] += 1
+                    stats[outcome] += 1
+                if outcome in ('success', 'skipped'):
+                    resolved.append(ledger_key(agency_name, url, dataset_name))
+            completed = True
+        finally:
+            # Written even when the run is cut short, so cron always finds a summary
+            self.resolve_errors(resolved)
+            self.manifest.save()
+            finished = datetime.now()
+            summary = {
+                'started_at': started.isoformat(),
+                'finished_at': finished.isoformat(),
+                'duration_seconds': round((finished - started).total_seconds(), 1),
+                'completed': completed,
+                'totals': totals,
+                'groups': groups,
+                'unresolved_errors': len(latest_failures(read_ledger(self.error_log))),
+                'http': get_http_client().report(),
+            }
+            summary_path = Path(summary_path or self.output_dir / 'batch_summary.json')
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+        return summary
 
     def process_agency_data(self, input_csv, agency_name):
         """Process all datasets using names from source CSV."""
@@ -109,94 +633,111 @@ class DatasetExtractor:
             return False
 
         try:
-            df = pd.read_csv(input_csv)
-
-            # Check required columns
-            required_columns = {'Data Link', 'Version Name'}
-            if not required_columns.issubset(df.columns):
-                missing = required_columns - set(df.columns)
-                logging.error(f"CSV file missing required columns: {missing}")
+            try:
+                jobs = self.load_jobs(input_csv, agency_name)
+            except ValueError as e:
+                logging.error(str(e))
                 return False
-
-            stats = {
-                'total': 0,
-                'success': 0,
-                'invalid_url': 0,
-                'api_error': 0,
-                'empty_response': 0,
-                'save_failed': 0
-            }
-
-            with tqdm(df.iterrows(), total=len(df), desc=f"Processing {agency_name}") as pbar:
-                for _, row in pbar:
-                    stats['total'] += 1
-                    url = row['Data Link']
-                    dataset_name = row['Version Name']
-
-                    # Skip invalid URLs
-                    if pd.isna(url) or not str(url).startswith('http'):
-                        stats['invalid_url'] += 1
-                        self.log_error(
-                            agency_name, str(url), dataset_name,
-                            'invalid_url', 'Missing or invalid URL'
-                        )
-                        continue
-
-                    # Fetch API data
-                    result = fetch_api_data(url)
-
-                    # Skip empty/invalid responses
-                    if result.get('is_empty', False):
-                        stats['empty_response'] += 1
-                        self.log_error(
-                            agency_name, url, dataset_name,
-                            'empty_response',
-                            result.get('error', 'Empty response'),
-                            result.get('status_code')
-                        )
-                        continue
-
-                    # Handle API errors
-                    if result['status'] != 'success':
-                        stats['api_error'] += 1
-                        self.log_error(
-                            agency_name, url, dataset_name,
-                            'api_error',
-                            result.get('error', 'Unknown API error'),
-                            result.get('status_code')
-                        )
-                        continue
-
-                    # Save dataset using name from source CSV
-                    if not self.save_dataset(result['data'], dataset_name, agency_name):
-                        stats['save_failed'] += 1
-                        self.log_error(
-                            agency_name, url, dataset_name,
-                            'save_failed', 'Failed to save dataset'
-                        )
-                        continue
-
-                    stats['success'] += 1
+            if self.plan:
+                self.plan_sizes(jobs)
+            # Largest known datasets first, so the long tail doesn't start last
+            jobs.sort(key=lambda job: -(self.known_size(job[0]) or 0))
+
+            stats = self.new_stats()
+            resolved = []
+            for url, dataset_name, _, outcome in self.run_jobs(jobs, f"Processing {agency_name}"):
+                stats['total'] += 1
+                stats[outcome] += 1
+                if outcome in ('success', 'skipped'):
+                    resolved.append(ledger_key(agency_name, url, dataset_name))
+            self.resolve_errors(resolved)
 
             # Print summary
             logging.info(f"\nProcessing summary for {agency_name}:")
             for stat, count in stats.items():
                 logging.info(f"  {stat.replace('_', ' ').title()}: {count}")
+            logging.info(f"  HTTP: {get_http_client().report()}")
 
-            return stats['success'] > 0
+            return stats['success'] + stats['skipped'] > 0
 
         except Exception as e:
             logging.error(f"Error processing {agency_name}: {str(e)}")
             return False
+        finally:
+            self.manifest.save()
+
+
+AGENCY_SOURCES = {
+    'local_executive': 'data/byMIO.csv',
+    'Central_Government': 'data/byCGO.csv',
+    'Quasi_Government': 'data/byQuasiOrg.csv'
+}
 
 
 def main():
-    extractor = DatasetExtractor()
-    agencies = {
-        'local_executive': 'data/byMIO.csv',
-        'Central_Government': 'data/byCGO.csv',
-        'Quasi_Government': 'data/byQuasiOrg.csv'
-    }
+    parser = argparse.ArgumentParser(description="Extract data.egov.kz datasets to CSV or Parquet")
+    parser.add_argument("--page-size", type=int, default=None,
+                        help="Fetch datasets in windows of this many records, streaming them to disk")
+    parser.add_argument("--window-concurrency", type=int, default=1,
+                        help="Download the windows of one dataset in parallel with this many threads")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of datasets extracted concurrently")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Requests per second to data.egov.kz across all threads (0 = unlimited)")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads",
+                        help="Thread pool (--workers) or asyncio pipeline (--concurrency)")
+    parser.add_argument("--concurrency", type=int, default=100,
+                        help="Requests in flight with the asyncio engine")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-extract datasets even if the manifest shows them unchanged")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check the sha256 of every file before skipping it, not just its size and mtime")
+    parser.add_argument("--denormalize", action="store_true",
+                        help="Also repeat the dataset metadata columns in every row (old layout)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv",
+                        help="Output file format; Parquet needs pyarrow")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default="none",
+                        help="Compress CSV output while it is written (.csv.gz / .csv.zst); zstd needs zstandard")
+    parser.add_argument("--cache", choices=CACHE_MODES, default="off",
+                        help="Cache API responses on disk; 'offline' replays from the cache without network")
+    parser.add_argument("--cache-ttl", type=int, default=None,
+                        help="Seconds a cached response is used before it is revalidated")
+    parser.add_argument("--plan", action="store_true",
+                        help="Probe record counts first to run the largest datasets first and page them automatically")
+    parser.add_argument("--delta", action="store_true",
+                        help="Fingerprint rows and write added/changed/removed rows when a dataset changes")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="Only re-extract the retryable failures recorded in extraction_errors.csv")
+    parser.add_argument("--batch", action="store_true",
+                        help="Extract all agency groups unattended and print a JSON summary")
+    parser.add_argument("--summary", default=None,
+                        help="Where --batch writes its JSON summary (default extracted_datasets/batch_summary.json)")
+    parser.add_argument("--retry-rounds", type=int, default=3,
+                        help="Attempts per failed dataset in --retry-errors mode")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help="Rows per Parquet row group")
+    args = parser.parse_args()
+
+    extractor = DatasetExtractor(
+        page_size=args.page_size, window_concurrency=args.window_concurrency,
+        workers=args.workers, rate_limit=args.rate_limit,
+        engine=args.engine, concurrency=args.concurrency, force=args.force,
+        denormalize=args.denormalize, output_format=args.format, row_group_size=args.row_group_size,
+        cache_mode=args.cache, cache_ttl=args.cache_ttl, plan=args.plan,
+        delta=args.delta, compression=args.compress, verify=args.verify
+    )
+    agencies = AGENCY_SOURCES
+
+    if args.retry_errors:
+        extractor.retry_failed(rounds=args.retry_rounds)
+        return
+
+    if args.batch:
+        summary = extractor.run_batch(AGENCY_SOURCES, summary_path=args.summary)
+        print(json.dumps(summary, ensure_ascii=False))
+        # Non-zero exit lets cron alert on failures worth looking at
+        totals = summary['totals']
+        sys.exit(1 if totals['api_error'] or totals['save_failed'] or totals['unexpected_error'] else 0)
 
     print("Kazakhstan Government Data Extractor")
     print("-----------------------------------")
@@ -1,72 +1,59 @@
 # main.py
 import os
+import argparse
 import json
-import time
 import logging
-import requests
 import csv
+from functools import partial
 from selenium.webdriver.common.by import By
 
 from config import BASE_URL, CGO_DATASOURCE, MIO_DATASOURCE, QUASIORG_DATASOURCE
+from utils.crawl_pool import CRAWL_CSV_COLUMNS, claim_next_agency, merge_crawl_parts, part_path_for, run_crawl_pool
+from utils.crawl_utils import build_search_url, fetch_dataset_links
+from utils.driver_supervisor import get_supervisor
+from utils.checkpoint import CrawlCheckpoint
+from utils.link_resolver import dataset_index_from_url, has_newer_version, parse_data_link, resolve_dataset_links
+from utils.metadata_downloader import MetadataDownloader, write_metadata_json
+from utils.http_cache import CACHE_MODES
+from utils.http_session import configure_cache, get_http_client
+from utils.waits import get_politeness, wait_for_search_page, wait_report
 from utils.selenium_utils import (
-    restart_chrome,
-    extract_metadata_with_recovery, is_session_valid, bypass_captcha_if_present, extract_base_metadata,
-    normalize_filename
+    extract_metadata_with_recovery, is_session_valid, bypass_captcha_if_present,
+    normalize_filename, record_page_load
 )
 import logging
 from datetime import datetime
 
 def log_diagnostic(message: str, log_file="logs/diagnostics.log"):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
     with open(log_file, "a", encoding="utf-8") as f:
         f.write(f"[{timestamp}] {message}\n")
 
 
-def download_metadata_from_link(meta_link, output_dir, version_name):
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-            "Accept": "application/json"
-        }
-        response = requests.get(meta_link, headers=headers, timeout=20)
-        if response.status_code == 200:
-            metadata = response.json()
-            file_name = normalize_filename(version_name) + ".json"
-            full_path = os.path.join(output_dir, file_name)
-            with open(full_path, "w", encoding="utf-8") as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
-            print(f"✅ Metadata saved to {full_path}")
-        else:
-            print(f"⚠️ Failed to download metadata. Status: {response.status_code}")
-    except Exception as e:
-        print(f"❌ Error downloading metadata from {meta_link}: {e}")
-        logging.error(f"Download error: {e}")
-
 def save_to_csv(csv_path, version_name, data_link,meta_link, dataset_url=""):
+    os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
     file_exists = os.path.isfile(csv_path)
     with open(csv_path, 'a', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
         if not file_exists:
-            writer.writerow(['Version Name', 'Data Link', 'Dataset URL'])
+            writer.writerow(CRAWL_CSV_COLUMNS)
         writer.writerow([version_name, data_link,meta_link, dataset_url])
 
-def load_gov_agencies(json_file):
+def load_gov_agencies(json_file, largest_first=False):
     with open(json_file, 'r', encoding='utf-8') as file:
-        return [item['govAgency'] for item in json.load(file)]
+        items = json.load(file)
+    if largest_first:
+        items = sorted(items, key=lambda item: item.get('allPlacedDatasetsCount') or 0, reverse=True)
+    return [item['govAgency'] for item in items]
 
-def process_dataset_page(driver, agency, metadata_dir, current_page, csv_path):
+def collect_dataset_links_with_driver(driver, agency, current_page, search_url):
+    """Dataset links of a search page: [] past the last page, None when CAPTCHAs or errors outlast the retries."""
     from utils.selenium_utils import refresh_driver
-    search_url = (
-        f"{BASE_URL}/datasets/search?text=&expType=1&govAgencyId={agency}&category="
-        "&pDateBeg=&pDateEnd=&statusType=1&actualType=&datasetSortSelect=createdDateDesc&"
-        f"page={current_page}"
-    )
-    log_diagnostic(f"[{agency}] 🔎 Page {current_page} → {search_url}")
-    print(f"[{agency}] 📄 Page {current_page} → {search_url}")
-
     MAX_PAGE_RETRIES = 3
     retry_count = 0
-    dataset_links = []
+    dataset_links = None
+    politeness = get_politeness()
 
     while retry_count < MAX_PAGE_RETRIES:
         try:
@@ -75,41 +62,98 @@ def process_dataset_page(driver, agency, metadata_dir, current_page, csv_path):
                 driver = refresh_driver()
 
             driver.get(search_url)
-            time.sleep(3)
+            get_supervisor().page_done()
+            state = wait_for_search_page(driver)
+            record_page_load(driver, "search")
 
-            # CAPTCHA bypass
-            bypass_captcha_if_present(driver)
+            if state == 'captcha':
+                politeness.backoff()
+                bypass_captcha_if_present(driver)
 
             if "502 Bad Gateway" in driver.page_source:
                 raise Exception("Detected 502 error")
 
-            dataset_links = [el.get_attribute("href") for el in
-                             driver.find_elements("css selector", 'a[href^="/datasets/view?index="]')]
+            links = [el.get_attribute("href") for el in
+                     driver.find_elements("css selector", 'a[href^="/datasets/view?index="]')]
 
-            if dataset_links:
+            if links:
+                politeness.success()
+                dataset_links = links
+                break
+            elif state == 'empty':
+                # The page settled without datasets or a CAPTCHA: past the last page
+                dataset_links = []
                 break
             else:
-                log_diagnostic(f"[{agency}] ⚠️ No datasets found on page {current_page}, retrying...")
+                log_diagnostic(f"[{agency}] ⚠️ No datasets found on page {current_page} ({state}), retrying...")
 
         except Exception as e:
             log_diagnostic(f"[{agency}] ❌ Exception on page {current_page} retry {retry_count+1}: {e}")
             driver = refresh_driver()
 
         retry_count += 1
-        time.sleep(2 ** retry_count)
+        politeness.backoff()
+        politeness.sleep('backoff')
+
+    return dataset_links, driver
+
+
+def process_dataset_page(driver, agency, metadata_dir, current_page, csv_path, use_http=True,
+                         checkpoint=None, datasource=None, incremental=False, downloader=None):
+    search_url = build_search_url(agency, current_page)
+    log_diagnostic(f"[{agency}] 🔎 Page {current_page} → {search_url}")
+    print(f"[{agency}] 📄 Page {current_page} → {search_url}")
 
+    dataset_links = fetch_dataset_links(agency, current_page) if use_http else None
+    if use_http:
+        if dataset_links is None:
+            get_politeness().backoff()
+        else:
+            get_politeness().success()
+
+    if dataset_links is None:
+        if use_http:
+            log_diagnostic(f"[{agency}] 🌐 Falling back to browser for page {current_page}")
+        driver = get_supervisor().acquire()
+        dataset_links, driver = collect_dataset_links_with_driver(driver, agency, current_page, search_url)
+
+    if dataset_links is None:
+        log_diagnostic(f"[{agency}] 🛑 Gave up on page {current_page} after retries.")
+        # Not a normal end of the agency: leave it unfinished in the checkpoint
+        raise RuntimeError(f"Gave up on page {current_page}")
     if not dataset_links:
-        log_diagnostic(f"[{agency}] 🛑 Gave up on page {current_page} after {MAX_PAGE_RETRIES} retries.")
+        log_diagnostic(f"[{agency}] ✅ No datasets on page {current_page}, agency complete.")
         return False, None, driver
 
+    supervisor = get_supervisor()
     processed = 0
+    skipped = 0
+    failed = 0
+    pending = []
 
     for link in dataset_links:
+        dataset_index = dataset_index_from_url(link)
+        version_hint = 1
         try:
-            metadata, driver = extract_metadata_with_recovery(driver, link)
-            meta_link = metadata.get("Meta Link", "")
-            version_name = metadata.get("Version Name", "dataset")
-            data_link = metadata.get("Data Link", "")
+            if checkpoint and dataset_index:
+                captured, known_version = checkpoint.dataset_version(dataset_index)
+                if captured:
+                    # Incremental runs re-resolve a known dataset only when a newer version was published
+                    if not incremental or known_version is None or not has_newer_version(dataset_index, known_version):
+                        skipped += 1
+                        continue
+                    version_hint = known_version + 1
+                    log_diagnostic(f"[{agency}] 🆕 {dataset_index} has a version after v{known_version}")
+
+            # Links are derived from the dataset index; only proxy datasets need the view page
+            page, metadata = resolve_dataset_links(link, version_hint) if use_http or incremental else (None, None)
+            if page is None:
+                driver = supervisor.acquire()
+                page, driver = extract_metadata_with_recovery(driver, link)
+                supervisor.page_done()
+            meta_link = page.meta_link
+            version_name = page.version_name or "dataset"
+            data_link = page.data_link
 
             log_diagnostic(
                 f"[{agency}] Processing: {version_name} — DataLink: {bool(data_link)}, MetaLink: {bool(meta_link)}")
@@ -117,34 +161,141 @@ def process_dataset_page(driver, agency, metadata_dir, current_page, csv_path):
             # Save to CSV regardless of whether there's metadata link or not
             save_to_csv(csv_path, version_name, data_link, meta_link, link)
 
-            # Download metadata from meta link if available
-            if meta_link:
-                os.makedirs(metadata_dir, exist_ok=True)
-                download_metadata_from_link(meta_link, metadata_dir, version_name)
+            mark_done = None
+            if checkpoint and dataset_index:
+                _, version = parse_data_link(data_link or meta_link)
+                mark_done = partial(checkpoint.mark_dataset_done, dataset_index, datasource, agency, version,
+                                    version_name)
+
+            # The resolver already has the meta JSON; otherwise it is downloaded in the background
+            # and the dataset only counts as captured once that download saved it
+            if metadata is not None:
+                write_metadata_json(metadata, metadata_dir, version_name)
+            elif meta_link:
+                pending.append((link, downloader.submit(meta_link, version_name, on_saved=mark_done)))
+                mark_done = None
 
             # Fallback: if both meta and data links are missing, extract base metadata manually
             if not meta_link and not data_link:
-                base_metadata = extract_base_metadata(driver, dataset_url=link)
+                base_metadata = page.to_base_metadata()
                 os.makedirs(metadata_dir, exist_ok=True)
                 file_path = os.path.join(metadata_dir, f"{normalize_filename(version_name)}.json")
                 with open(file_path, "w", encoding="utf-8") as f:
                     json.dump(base_metadata, f, indent=2, ensure_ascii=False)
                 log_diagnostic(f"[{agency}] 📦 Saved fallback base metadata for {version_name}")
 
+            if mark_done:
+                mark_done()
             processed += 1
 
         except Exception as e:
+            failed += 1
             log_diagnostic(f"[{agency}] ❌ Failed to process {link}: {e}")
 
-    log_diagnostic(f"[{agency}] ✅ Page {current_page} complete. {processed} datasets processed.")
+    # Failed meta downloads leave their datasets pending, so the page can't be marked done before them
+    for link, future in pending:
+        if future.result() is None:
+            processed -= 1
+            failed += 1
+            log_diagnostic(f"[{agency}] ❌ Meta download failed for {link}")
+
+    # A page with failures stays open so the next run retries just the missing datasets.
+    # Incremental runs don't mark pages: new datasets shift every page down.
+    if checkpoint and not failed and not incremental:
+        checkpoint.mark_page_done(datasource, agency, current_page)
+
+    log_diagnostic(
+        f"[{agency}] ✅ Page {current_page} complete. {processed} datasets processed, "
+        f"{skipped} already captured, {failed} failed.")
+
+    # Newest datasets come first, so a page with nothing new or changed means the rest is known too
+    if incremental and not processed and not failed:
+        log_diagnostic(f"[{agency}] ⏹️ Page {current_page} has only known datasets, stopping.")
+        return False, None, driver
     return True, current_page + 1, driver
 
 
+def crawl_agency(driver, agency, metadata_dir, csv_path, use_http=True, checkpoint=None, datasource=None,
+                 incremental=False, downloader=None):
+    if checkpoint and not incremental and checkpoint.is_agency_done(datasource, agency):
+        print(f"⏭️ Agency {agency} already crawled")
+        return driver
+
+    print(f"\n🔍 Processing agency: {agency}")
+    os.makedirs(metadata_dir, exist_ok=True)
+
+    page = 1
+    while checkpoint and not incremental and checkpoint.is_page_done(datasource, agency, page):
+        page += 1
+    if page > 1:
+        log_diagnostic(f"[{agency}] ⏩ Resuming at page {page}")
+
+    while True:
+        has_more, next_page, driver = process_dataset_page(
+            driver, agency, metadata_dir, page, csv_path, use_http=use_http,
+            checkpoint=checkpoint, datasource=datasource, incremental=incremental, downloader=downloader
+        )
+        if not has_more:
+            break
+        page = next_page or (page + 1)
+        get_politeness().sleep()
+
+    if checkpoint and not incremental:
+        checkpoint.mark_agency_done(datasource, agency)
+    return driver
+
+
+def crawl_worker(worker_id, next_index, agencies, csv_path, use_http, datasource, incremental=False,
+                 cache_mode="off"):
+    """Crawl agencies from the shared list with this worker's own browser until none are left."""
+    if cache_mode != "off":
+        configure_cache(cache_mode)
+    part_path = part_path_for(csv_path, worker_id)
+    metadata_dir = os.path.join("results/metadata")
+    supervisor = get_supervisor()
+    checkpoint = CrawlCheckpoint()
+    downloader = MetadataDownloader(metadata_dir)
+    driver = None
+
+    while True:
+        agency = claim_next_agency(next_index, agencies)
+        if agency is None:
+            break
+        try:
+            driver = crawl_agency(driver, agency, metadata_dir, part_path, use_http=use_http,
+                                  checkpoint=checkpoint, datasource=datasource, incremental=incremental,
+                                  downloader=downloader)
+        except Exception as e:
+            # Only this worker's browser is thrown away; the others keep crawling
+            log_diagnostic(f"[worker {worker_id}] ❌ Agency {agency} failed: {e}")
+            supervisor.quit()
+            driver = None
+
+    supervisor.quit()
+    downloader.close()
+    checkpoint.close()
+    log_diagnostic(f"[worker {worker_id}] {supervisor.report()}")
+    log_diagnostic(f"[worker {worker_id}] Waits: {wait_report()}")
+    print(f"[worker {worker_id}] {supervisor.report()}")
+    print(f"[worker {worker_id}] Waits: {wait_report()}")
+    log_diagnostic(f"[worker {worker_id}] HTTP: {get_http_client().report()}")
+
+
 def main():
-    driver = restart_chrome()
-    if not driver:
-        print("❌ Could not start browser")
-        return
+    parser = argparse.ArgumentParser(description="Collect dataset links from data.egov.kz")
+    parser.add_argument("--crawler", choices=["http", "browser"], default="http",
+                        help="Read search pages over plain HTTP (browser only on CAPTCHA/502) or always in Chrome")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of crawl processes, each with its own browser")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only pick up new datasets and new versions, stopping each agency at its first known page")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Revisit all agencies and pages instead of resuming from the checkpoint")
+    parser.add_argument("--cache", choices=CACHE_MODES, default="off",
+                        help="Cache meta JSON on disk; 'offline' serves meta JSON only from the cache "
+                             "(search pages are always fetched live)")
+    args = parser.parse_args()
+    use_http = args.crawler == "http"
 
     datasets = {
         #CGO_DATASOURCE: "data/byCGO.csv",
@@ -153,22 +304,22 @@ def main():
     }
 
     for json_file, csv_path in datasets.items():
-        gov_agencies = load_gov_agencies(json_file)
-
-        for agency in gov_agencies:
-            print(f"\n🔍 Processing agency: {agency}")
-            metadata_dir = os.path.join("results/metadata")
-            os.makedirs(metadata_dir, exist_ok=True)
-
-            page = 1
-            while True:
-                has_more, next_page, driver = process_dataset_page(driver, agency, metadata_dir, page, csv_path)
-                if not has_more:
-                    break
-                page = next_page or (page + 1)
-                time.sleep(1)
-
-    driver.quit()
+        gov_agencies = load_gov_agencies(json_file, largest_first=args.workers > 1)
+        # Leftover parts from an interrupted run are merged first so nothing is lost
+        merge_crawl_parts(csv_path)
+
+        checkpoint = CrawlCheckpoint()
+        if args.fresh:
+            checkpoint.reset(json_file)
+        seeded = checkpoint.seed_from_csv(json_file, csv_path)
+        if seeded:
+            print(f"📌 {seeded} datasets from {csv_path} registered in the checkpoint")
+        checkpoint.close()
+
+        run_crawl_pool(crawl_worker, gov_agencies, args.workers, csv_path, use_http, json_file, args.incremental,
+                       args.cache)
+        added = merge_crawl_parts(csv_path)
+        print(f"✅ {csv_path}: {added} new datasets")
 
 if __name__ == "__main__":
     main()
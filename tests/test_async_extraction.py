@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+
+import httpx
+
+from utils import async_extraction
+from utils.async_extraction import fetch_with_retries, run_async_extraction
+
+DATA_LINK = "https://data.egov.kz/api/v4/test_index/v1?apiKey=yourApiKey"
+RECORDS = [{"id": 1, "name": "Алматы"}, {"id": 2, "name": "Астана"}]
+
+
+def flaky_transport(statuses):
+    """Answers with the given statuses in turn, then 200 with RECORDS; counts the requests."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) <= len(statuses):
+            return httpx.Response(statuses[len(calls) - 1], headers={"Retry-After": "0"})
+        return httpx.Response(200, json=RECORDS)
+
+    return httpx.MockTransport(handler), calls
+
+
+class StubExtractor:
+    """The parts of DatasetExtractor the async pipeline calls; handle_result keeps the results."""
+
+    denormalize = False
+
+    def __init__(self):
+        self.results = []
+
+    def download_mode(self, url):
+        return 'single'
+
+    def is_unchanged(self, url, dataset_name, agency_name):
+        return False
+
+    def handle_result(self, result, url, dataset_name, agency_name):
+        self.results.append(result)
+        return 'success' if result['status'] == 'success' else 'api_error'
+
+
+class FetchWithRetriesTest(unittest.IsolatedAsyncioTestCase):
+    async def test_503_then_200_is_retried(self):
+        transport, calls = flaky_transport([503])
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await fetch_with_retries(client, DATA_LINK)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(calls), 2)
+
+    async def test_last_error_is_returned_when_retries_run_out(self):
+        transport, calls = flaky_transport([502, 502, 502])
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await fetch_with_retries(client, DATA_LINK, retries=2)
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(len(calls), 3)
+
+    async def test_client_errors_are_not_retried(self):
+        transport, calls = flaky_transport([404])
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await fetch_with_retries(client, DATA_LINK)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(calls), 1)
+
+
+class AsyncPipelineRetryTest(unittest.TestCase):
+    def test_503_then_200_extracts_the_dataset(self):
+        transport, calls = flaky_transport([503])
+        real_client = httpx.AsyncClient
+
+        def client_with_transport(**kwargs):
+            kwargs.pop('http2', None)
+            return real_client(transport=transport, **kwargs)
+
+        extractor = StubExtractor()
+        with mock.patch.object(async_extraction.httpx, 'AsyncClient', side_effect=client_with_transport):
+            outcomes = run_async_extraction(extractor, [(DATA_LINK, "Test", "Agency")], concurrency=2)
+
+        self.assertEqual(outcomes, [(DATA_LINK, "Test", "Agency", 'success')])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(extractor.results[0]['data'], RECORDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,16 @@
 # api_utils.py
+import json
+import os
 import requests
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 from datetime import datetime
 from config import API_KEY, HEADERS
+from utils.http_session import http_get
+
+DEFAULT_PAGE_SIZE = 1000
 
 
 def sanitize_filename(name):
@@ -79,106 +85,471 @@ def normalize_api_url(url):
         return None
 
 
-def fetch_api_data(url):
-    """Fetch API data with robust empty response handling."""
-    normalized_url = normalize_api_url(url)
-    if not normalized_url:
+def http_error_result(response, url, normalized_url):
+    """Error result for a non-200 API response."""
+    if getattr(response, 'offline_miss', False):
         return {
             'status': 'error',
-            'error': 'Invalid URL',
+            'error': 'Not in the HTTP cache (offline mode)',
             'source_url': url,
+            'normalized_url': normalized_url,
+            'is_empty': False,
+            'offline_miss': True
+        }
+
+    error_msg = f"HTTP {response.status_code}"
+    if response.text:
+        try:
+            error_data = response.json()
+            error_msg = get_nested_value(error_data, 'message') or get_nested_value(error_data,
+                                                                                    'error') or error_msg
+        except ValueError:
+            error_msg = f"{error_msg}: {response.text[:200]}"
+
+    return {
+        'status': 'error',
+        'error': error_msg,
+        'status_code': response.status_code,
+        'source_url': url,
+        'normalized_url': normalized_url,
+        'is_empty': response.status_code == 404  # Mark 404s as empty
+    }
+
+
+# Keys build_metadata adds; rows carry them only in the denormalized layout
+METADATA_FIELDS = (
+    'version_name', 'version_description', 'version_keywords', 'extraction_date', 'api_endpoint', 'source_url'
+)
+
+
+def has_data_columns(columns):
+    """True when a column set has anything besides the attached metadata fields."""
+    return any(col not in METADATA_FIELDS for col in columns)
+
+
+def build_metadata(response, data, url, normalized_url):
+    """Dataset-level metadata taken from response headers or the payload."""
+    version_name = sanitize_filename(
+        response.headers.get('X-Version-Name') or
+        get_nested_value(data, 'version_name') or
+        get_nested_value(data, 'name') or
+        url.split('/')[-1].split('?')[0]
+    )
+
+    return {
+        'version_name': version_name,
+        'version_description':
+            response.headers.get('X-Version-Description') or
+            get_nested_value(data, 'version_description') or
+            get_nested_value(data, 'description') or '',
+        'version_keywords':
+            response.headers.get('X-Version-Keywords', '').split(',') or
+            get_nested_value(data, 'version_keywords', []) or
+            get_nested_value(data, 'keywords', []),
+        'extraction_date': datetime.now().isoformat(),
+        'api_endpoint': normalized_url,
+        'source_url': url
+    }
+
+
+def attach_metadata(data, metadata):
+    if isinstance(data, dict):
+        data.update(metadata)
+    elif isinstance(data, list) and data and isinstance(data[0], dict):
+        for item in data:
+            item.update(metadata)
+
+
+def parse_api_response(response, url, normalized_url, denormalize=False):
+    """
+    Turn an API response into the fetch_api_data result dict.
+
+    Works with any response object exposing status_code, headers, text and json(),
+    so the requests and httpx based engines produce identical results. Metadata is
+    returned once under 'metadata'; with denormalize it is also copied into every row.
+    """
+    if response.status_code != 200:
+        return http_error_result(response, url, normalized_url)
+
+    try:
+        data = response.json()
+    except ValueError as e:
+        return {
+            'status': 'error',
+            'error': f'Invalid JSON: {str(e)}',
+            'source_url': url,
+            'normalized_url': normalized_url,
             'is_empty': True
         }
 
+    if not is_valid_response(data):
+        return {
+            'status': 'error',
+            'error': 'Empty or invalid response data',
+            'source_url': url,
+            'normalized_url': normalized_url,
+            'is_empty': True
+        }
+
+    metadata = build_metadata(response, data, url, normalized_url)
+    if denormalize:
+        attach_metadata(data, metadata)
+
+    return {
+        'status': 'success',
+        'data': data,
+        'metadata': metadata,
+        'source_url': url,
+        'normalized_url': normalized_url,
+        'version_name': metadata['version_name'],
+        'is_empty': False
+    }
+
+
+def invalid_url_result(url):
+    return {
+        'status': 'error',
+        'error': 'Invalid URL',
+        'source_url': url,
+        'is_empty': True
+    }
+
+
+def request_error_result(url, normalized_url, error):
+    return {
+        'status': 'error',
+        'error': f'Request failed: {str(error)}',
+        'source_url': url,
+        'normalized_url': normalized_url,
+        'is_empty': True
+    }
+
+
+def fetch_api_data(url, denormalize=False):
+    """Fetch API data with robust empty response handling."""
+    normalized_url = normalize_api_url(url)
+    if not normalized_url:
+        return invalid_url_result(url)
+
     try:
-        response = requests.get(
+        response = http_get(
             normalized_url,
             headers=HEADERS,
             timeout=15,
-            verify=True
+            verify=True,
+            cache=True
         )
+        return parse_api_response(response, url, normalized_url, denormalize=denormalize)
 
-        if response.status_code != 200:
-            error_msg = f"HTTP {response.status_code}"
-            if response.text:
-                try:
-                    error_data = response.json()
-                    error_msg = get_nested_value(error_data, 'message') or get_nested_value(error_data,
-                                                                                            'error') or error_msg
-                except ValueError:
-                    error_msg = f"{error_msg}: {response.text[:200]}"
-
-            return {
-                'status': 'error',
-                'error': error_msg,
-                'status_code': response.status_code,
-                'source_url': url,
-                'normalized_url': normalized_url,
-                'is_empty': response.status_code == 404  # Mark 404s as empty
-            }
+    except requests.exceptions.RequestException as e:
+        return request_error_result(url, normalized_url, e)
 
-        try:
-            data = response.json()
-        except ValueError as e:
-            return {
-                'status': 'error',
-                'error': f'Invalid JSON: {str(e)}',
-                'source_url': url,
-                'normalized_url': normalized_url,
-                'is_empty': True
-            }
 
-        if not is_valid_response(data):
-            return {
-                'status': 'error',
-                'error': 'Empty or invalid response data',
-                'source_url': url,
-                'normalized_url': normalized_url,
-                'is_empty': True
-            }
+def build_page_url(normalized_url, start, size):
+    """Add a v4 `source` window ({"from": .., "size": ..}) to a normalized API URL."""
+    parsed = urlparse(normalized_url)
+    query_params = parse_qs(parsed.query)
+    query_params['source'] = [json.dumps({'from': start, 'size': size}, separators=(',', ':'))]
+    return urlunparse(parsed._replace(query=urlencode(query_params, doseq=True)))
 
-        version_name = sanitize_filename(
-            response.headers.get('X-Version-Name') or
-            get_nested_value(data, 'version_name') or
-            get_nested_value(data, 'name') or
-            url.split('/')[-1].split('?')[0]
-        )
 
-        metadata = {
-            'version_name': version_name,
-            'version_description':
-                response.headers.get('X-Version-Description') or
-                get_nested_value(data, 'version_description') or
-                get_nested_value(data, 'description') or '',
-            'version_keywords':
-                response.headers.get('X-Version-Keywords', '').split(',') or
-                get_nested_value(data, 'version_keywords', []) or
-                get_nested_value(data, 'keywords', []),
-            'extraction_date': datetime.now().isoformat(),
-            'api_endpoint': normalized_url,
-            'source_url': url
+def fetch_api_page(normalized_url, start, size, url=None, timeout=60):
+    """Fetch one from/size window; returns (records, response) or (None, error result)."""
+    page_url = build_page_url(normalized_url, start, size)
+    try:
+        response = http_get(page_url, headers=HEADERS, timeout=timeout, verify=True, cache=True)
+    except requests.exceptions.RequestException as e:
+        return None, {
+            'status': 'error',
+            'error': f'Request failed at offset {start}: {str(e)}',
+            'source_url': url,
+            'normalized_url': normalized_url,
+            'is_empty': False
         }
 
-        if isinstance(data, dict):
-            data.update(metadata)
-        elif isinstance(data, list) and data and isinstance(data[0], dict):
-            for item in data:
-                item.update(metadata)
+    if response.status_code != 200:
+        return None, http_error_result(response, url, normalized_url)
 
-        return {
-            'status': 'success',
-            'data': data,
+    try:
+        data = response.json()
+    except ValueError as e:
+        return None, {
+            'status': 'error',
+            'error': f'Invalid JSON at offset {start}: {str(e)}',
             'source_url': url,
             'normalized_url': normalized_url,
-            'version_name': version_name,
             'is_empty': False
         }
 
-    except requests.exceptions.RequestException as e:
+    if isinstance(data, dict):
+        data = [data] if is_valid_response(data) else []
+    return data, response
+
+
+def repeats_page(records, *earlier_firsts):
+    """True when a window starts with the first record of an earlier window, i.e. the API ignored `from`."""
+    return bool(records) and any(first is not None and records[0] == first for first in earlier_firsts)
+
+
+def fetch_api_data_paged(url, sink, page_size=DEFAULT_PAGE_SIZE, denormalize=False):
+    """
+    Walk a v4 dataset in fixed-size from/size windows and pass each page of records to sink.
+
+    Only one page is held in memory at a time. Returns a result dict shaped like
+    fetch_api_data's, with 'records' and 'pages' counts instead of 'data'.
+    """
+    normalized_url = normalize_api_url(url)
+    if not normalized_url:
+        return {
+            'status': 'error',
+            'error': 'Invalid URL',
+            'source_url': url,
+            'is_empty': True
+        }
+
+    start = 0
+    pages = 0
+    metadata = None
+    previous_first = None
+    while True:
+        records, response = fetch_api_page(normalized_url, start, page_size, url=url)
+        if records is None:
+            return response
+
+        # A dataset of exactly page_size rows behind an API that ignores the window
+        # would otherwise come back as the same full page forever
+        if repeats_page(records, previous_first):
+            logging.warning(f"API ignored the window at offset {start} for {url}, stopping")
+            break
+        previous_first = records[0] if records else None
+
+        if records:
+            if metadata is None:
+                metadata = build_metadata(response, records, url, normalized_url)
+            if denormalize:
+                attach_metadata(records, metadata)
+            sink(records)
+            pages += 1
+        start += len(records)
+
+        # A short page is the last one; a page larger than asked means the API ignored the window
+        if len(records) != page_size:
+            break
+
+    if start == 0:
         return {
             'status': 'error',
-            'error': f'Request failed: {str(e)}',
+            'error': 'Empty or invalid response data',
+            'source_url': url,
+            'normalized_url': normalized_url,
+            'is_empty': True
+        }
+
+    return {
+        'status': 'success',
+        'records': start,
+        'pages': pages,
+        'metadata': metadata,
+        'source_url': url,
+        'normalized_url': normalized_url,
+        'version_name': metadata['version_name'],
+        'is_empty': False
+    }
+
+
+def _window_has_records(normalized_url, offset, url=None):
+    records, response = fetch_api_page(normalized_url, offset, 1, url=url, timeout=30)
+    if records is None:
+        raise requests.exceptions.RequestException(response.get('error', 'probe failed'))
+    return bool(records), records, response
+
+
+def probe_total_records(url, hint=None):
+    """
+    Count the records of a v4 dataset without downloading it.
+
+    Probes single-record windows: gallops over offsets 1, 2, 4, ... until one is empty,
+    then bisects, so a million-row dataset costs about 40 tiny requests. With the count
+    from an earlier probe as hint, an unchanged dataset costs three.
+    Returns (total, first record response) or (None, error result).
+    """
+    normalized_url = normalize_api_url(url) if url else None
+    if not normalized_url:
+        return None, {'status': 'error', 'error': 'Invalid URL', 'source_url': url, 'is_empty': True}
+
+    try:
+        has_first, first_records, first_response = _window_has_records(normalized_url, 0, url)
+        if not has_first:
+            return 0, first_response
+        if len(first_records) > 1:
+            # The API ignored the window: everything came back in one response
+            return len(first_records), first_response
+
+        # low always holds a record; high, once known, doesn't
+        low, high = 0, None
+        if hint and hint > 1:
+            if _window_has_records(normalized_url, hint - 1, url)[0]:
+                low = hint - 1
+            else:
+                high = hint - 1
+        step = 1
+        while high is None:
+            if _window_has_records(normalized_url, low + step, url)[0]:
+                low += step
+                step *= 2
+            else:
+                high = low + step
+        while high - low > 1:
+            middle = (low + high) // 2
+            if _window_has_records(normalized_url, middle, url)[0]:
+                low = middle
+            else:
+                high = middle
+        return high, first_response
+    except requests.exceptions.RequestException as e:
+        return None, {
+            'status': 'error',
+            'error': f'Size probe failed: {str(e)}',
             'source_url': url,
             'normalized_url': normalized_url,
+            'is_empty': False
+        }
+
+
+def _remove_parts(part_paths):
+    for part_path in part_paths:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def _download_window(normalized_url, start, size, part_path, url):
+    records, response = fetch_api_page(normalized_url, start, size, url=url)
+    if records is None:
+        return response
+    if len(records) > size:
+        return {'status': 'unpaged'}
+    with open(part_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False)
+    return None
+
+
+def fetch_api_data_partitioned(url, sink, work_dir, page_size=DEFAULT_PAGE_SIZE, concurrency=4, max_rounds=3,
+                               denormalize=False, total=None, size_hint=None):
+    """
+    Download a large v4 dataset as disjoint from/size windows in parallel.
+
+    The record count is probed first (starting from size_hint), unless a fresh count is
+    passed as total, in which case one single-record request fetches the metadata.
+    Windows are written to numbered part files in work_dir by up to `concurrency`
+    threads, and failed windows alone are re-fetched (up to max_rounds). Parts are then
+    fed to sink in offset order and removed; any records published after the count are
+    picked up serially at the end.
+    """
+    if total is None:
+        total, probe_response = probe_total_records(url, hint=size_hint)
+        if total is None:
+            return probe_response
+    else:
+        normalized_url = normalize_api_url(url)
+        if not normalized_url:
+            return {'status': 'error', 'error': 'Invalid URL', 'source_url': url, 'is_empty': True}
+        first_records, probe_response = fetch_api_page(normalized_url, 0, 1, url=url, timeout=30)
+        if first_records is None:
+            return probe_response
+        if len(first_records) > 1:
+            # The API ignores windows here: one paged walk returns the whole dataset
+            return fetch_api_data_paged(url, sink, page_size=page_size, denormalize=denormalize)
+        if not first_records:
+            total = 0
+    if total == 0:
+        return {
+            'status': 'error',
+            'error': 'Empty or invalid response data',
+            'source_url': url,
+            'normalized_url': normalize_api_url(url),
             'is_empty': True
-        }
\ No newline at end of file
+        }
+
+    normalized_url = normalize_api_url(url)
+    if total <= page_size:
+        return fetch_api_data_paged(url, sink, page_size=page_size, denormalize=denormalize)
+    os.makedirs(work_dir, exist_ok=True)
+    windows = {start: os.path.join(work_dir, f"{start // page_size:06d}.json") for start in range(0, total, page_size)}
+    pending = list(windows)
+    last_error = None
+
+    for round_number in range(max_rounds):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(_download_window, normalized_url, start, page_size, windows[start], url): start
+                for start in pending
+            }
+            failed = []
+            for future in as_completed(futures):
+                error = future.result()
+                if error is not None:
+                    failed.append(futures[future])
+                    last_error = error
+        if last_error and last_error.get('status') == 'unpaged':
+            # The API ignores windows here: one paged walk returns the whole dataset
+            _remove_parts(windows.values())
+            return fetch_api_data_paged(url, sink, page_size=page_size, denormalize=denormalize)
+        if not failed:
+            break
+        logging.warning(f"{len(failed)} windows failed for {url}, retry round {round_number + 1}")
+        pending = sorted(failed)
+    else:
+        _remove_parts(windows.values())
+        last_error['error'] = f"{len(pending)} windows failed: {last_error.get('error')}"
+        return last_error
+
+    metadata = None
+    records_seen = 0
+    pages = 0
+    # An API ignoring `from` answers with the head of the dataset or repeats the last window
+    head_first = previous_first = None
+    for start in sorted(windows):
+        with open(windows[start], 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        os.remove(windows[start])
+        if not records:
+            continue
+        if head_first is None:
+            head_first = records[0]
+        previous_first = records[0]
+        if metadata is None:
+            metadata = build_metadata(probe_response, records, url, normalized_url)
+        if denormalize:
+            attach_metadata(records, metadata)
+        sink(records)
+        records_seen += len(records)
+        pages += 1
+
+    # Records added after the probe
+    start = records_seen
+    while True:
+        records, response = fetch_api_page(normalized_url, start, page_size, url=url)
+        if not records or repeats_page(records, head_first, previous_first):
+            break
+        previous_first = records[0]
+        if metadata is None:
+            metadata = build_metadata(response, records, url, normalized_url)
+        if denormalize:
+            attach_metadata(records, metadata)
+        sink(records)
+        records_seen += len(records)
+        pages += 1
+        start += len(records)
+        if len(records) != page_size:
+            break
+
+    return {
+        'status': 'success',
+        'records': records_seen,
+        'pages': pages,
+        'metadata': metadata,
+        'source_url': url,
+        'normalized_url': normalized_url,
+        'version_name': metadata['version_name'] if metadata else '',
+        'is_empty': False
+    }
@@ -0,0 +1,176 @@
+#async_extraction.py
+import asyncio
+import logging
+from urllib.parse import urlparse
+
+from config import HEADERS, HTTP_MAX_RETRIES
+from utils.api_utils import (
+    invalid_url_result, normalize_api_url, parse_api_response, request_error_result
+)
+from utils.http_session import RETRY_STATUSES, backoff_delay
+from utils.rate_limit import get_rate_limiter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 -- lets httpx negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+ASYNC_AVAILABLE = httpx is not None
+if ASYNC_AVAILABLE:
+    # httpx logs every request at INFO, which would drown extraction.log
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Multiplexed over HTTP/2, a handful of connections carries hundreds of requests
+MAX_CONNECTIONS = 8
+DECODE_WORKERS = 4
+WRITE_WORKERS = 4
+
+
+async def fetch_with_retries(client, url, retries=HTTP_MAX_RETRIES):
+    """GET with the shared client's policy: timeouts, network errors and 429/5xx are retried with backoff."""
+    # Logged without the query string, which carries the API key
+    label = urlparse(url)._replace(query='').geturl()
+    for attempt in range(retries + 1):
+        await get_rate_limiter().wait_async(url)
+        try:
+            response = await client.get(url)
+        except (httpx.TimeoutException, httpx.NetworkError) as e:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"{e.__class__.__name__} for {label}, retrying in {delay:.1f}s")
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            delay = backoff_delay(attempt, response)
+            logging.warning(f"HTTP {response.status_code} for {label}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def _fetch_job(client, extractor, job, decode_queue, write_queue):
+    url, dataset_name, agency_name = job
+
+    # Invalid links and paged downloads don't fit the single-request pipeline
+    if not isinstance(url, str) or not url.startswith('http') or extractor.download_mode(url) != 'single':
+        outcome = await asyncio.to_thread(extractor.run_job, url, dataset_name, agency_name)
+        await write_queue.put((None, url, dataset_name, agency_name, outcome))
+        return
+
+    if await asyncio.to_thread(extractor.is_unchanged, url, dataset_name, agency_name):
+        await write_queue.put((None, url, dataset_name, agency_name, 'skipped'))
+        return
+
+    normalized_url = normalize_api_url(url)
+    if not normalized_url:
+        await decode_queue.put((url, dataset_name, agency_name, None, None, invalid_url_result(url)))
+        return
+
+    try:
+        response = await fetch_with_retries(client, normalized_url)
+    except httpx.HTTPError as e:
+        await decode_queue.put((url, dataset_name, agency_name, normalized_url, None,
+                                request_error_result(url, normalized_url, e)))
+        return
+    await decode_queue.put((url, dataset_name, agency_name, normalized_url, response, None))
+
+
+async def _fetch_stage(client, extractor, fetch_queue, decode_queue, write_queue):
+    while True:
+        job = await fetch_queue.get()
+        if job is None:
+            return
+        try:
+            await _fetch_job(client, extractor, job, decode_queue, write_queue)
+        except Exception as e:
+            # One broken job must not take its fetcher, and with it the pipeline, down
+            outcome = await asyncio.to_thread(extractor.job_failed, *job, e)
+            await write_queue.put((None, *job, outcome))
+
+
+async def _decode_stage(extractor, decode_queue, write_queue):
+    while True:
+        item = await decode_queue.get()
+        if item is None:
+            return
+        url, dataset_name, agency_name, normalized_url, response, result = item
+        outcome = None
+        if response is not None:
+            try:
+                result = await asyncio.to_thread(parse_api_response, response, url, normalized_url,
+                                                 extractor.denormalize)
+            except Exception as e:
+                outcome = await asyncio.to_thread(extractor.job_failed, url, dataset_name, agency_name, e)
+        await write_queue.put((result, url, dataset_name, agency_name, outcome))
+
+
+async def _write_stage(extractor, write_queue, outcomes, pbar):
+    while True:
+        item = await write_queue.get()
+        if item is None:
+            return
+        result, url, dataset_name, agency_name, outcome = item
+        if outcome is None:
+            try:
+                outcome = await asyncio.to_thread(extractor.handle_result, result, url, dataset_name, agency_name)
+            except Exception as e:
+                outcome = await asyncio.to_thread(extractor.job_failed, url, dataset_name, agency_name, e)
+        outcomes.append((url, dataset_name, agency_name, outcome))
+        if pbar is not None:
+            pbar.update(1)
+
+
+async def _run_pipeline(extractor, jobs, concurrency, pbar):
+    fetch_queue = asyncio.Queue(maxsize=concurrency * 2)
+    decode_queue = asyncio.Queue(maxsize=concurrency)
+    write_queue = asyncio.Queue(maxsize=concurrency)
+    outcomes = []
+
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS if HTTP2_AVAILABLE else concurrency,
+                          max_keepalive_connections=MAX_CONNECTIONS if HTTP2_AVAILABLE else concurrency)
+    async with httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=limits, headers=HEADERS,
+                                 timeout=httpx.Timeout(60, connect=15)) as client:
+        fetchers = [
+            asyncio.create_task(_fetch_stage(client, extractor, fetch_queue, decode_queue, write_queue))
+            for _ in range(concurrency)
+        ]
+        decoders = [asyncio.create_task(_decode_stage(extractor, decode_queue, write_queue)) for _ in range(DECODE_WORKERS)]
+        writers = [
+            asyncio.create_task(_write_stage(extractor, write_queue, outcomes, pbar))
+            for _ in range(WRITE_WORKERS)
+        ]
+
+        for job in jobs:
+            await fetch_queue.put(job)
+        for _ in fetchers:
+            await fetch_queue.put(None)
+        await asyncio.gather(*fetchers)
+
+        for _ in decoders:
+            await decode_queue.put(None)
+        await asyncio.gather(*decoders)
+
+        for _ in writers:
+            await write_queue.put(None)
+        await asyncio.gather(*writers)
+
+    return outcomes
+
+
+def run_async_extraction(extractor, jobs, concurrency=100, pbar=None):
+    """
+    Extract (url, dataset_name, agency_name) jobs with an asyncio fetch -> decode -> write pipeline.
+
+    Stages are connected by bounded queues, so a slow disk throttles fetching instead of
+    buffering responses. Returns (url, dataset_name, agency_name, outcome) for every job.
+    """
+    if not ASYNC_AVAILABLE:
+        raise RuntimeError("The async engine needs httpx: pip install 'httpx[http2]'")
+    logging.info(f"Async extraction of {len(jobs)} datasets, concurrency {concurrency}, "
+                 f"HTTP/2 {'on' if HTTP2_AVAILABLE else 'off'}")
+    return asyncio.run(_run_pipeline(extractor, jobs, max(1, concurrency), pbar))
@@ -0,0 +1,138 @@
+#checkpoint.py
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from utils.crawl_pool import read_crawl_rows
+from utils.link_resolver import dataset_index_from_url, parse_data_link
+
+CHECKPOINT_PATH = "data/crawl_checkpoint.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    datasource TEXT NOT NULL,
+    agency TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (datasource, agency, page)
+);
+CREATE TABLE IF NOT EXISTS agencies (
+    datasource TEXT NOT NULL,
+    agency TEXT NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (datasource, agency)
+);
+CREATE TABLE IF NOT EXISTS datasets (
+    dataset_index TEXT PRIMARY KEY,
+    datasource TEXT,
+    agency TEXT,
+    version INTEGER,
+    version_name TEXT,
+    captured_at TEXT NOT NULL
+);
+"""
+
+
+class CrawlCheckpoint:
+    """
+    Durable record of finished crawl work, shared by all crawl workers.
+
+    Every mark is committed immediately, so a crash loses at most the page in flight.
+    The connection is shared with the metadata download threads, which mark datasets
+    done once their meta JSON is saved.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _now(self):
+        return datetime.now().isoformat()
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def is_agency_done(self, datasource, agency):
+        row = self._execute(
+            "SELECT 1 FROM agencies WHERE datasource = ? AND agency = ?", (datasource, agency)
+        )
+        return row is not None
+
+    def mark_agency_done(self, datasource, agency):
+        self._execute(
+            "INSERT OR REPLACE INTO agencies VALUES (?, ?, ?)", (datasource, agency, self._now())
+        )
+
+    def is_page_done(self, datasource, agency, page):
+        row = self._execute(
+            "SELECT 1 FROM pages WHERE datasource = ? AND agency = ? AND page = ?", (datasource, agency, page)
+        )
+        return row is not None
+
+    def mark_page_done(self, datasource, agency, page):
+        self._execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", (datasource, agency, page, self._now())
+        )
+
+    def is_dataset_done(self, dataset_index):
+        row = self._execute(
+            "SELECT 1 FROM datasets WHERE dataset_index = ?", (dataset_index,)
+        )
+        return row is not None
+
+    def dataset_version(self, dataset_index):
+        """(captured, version) of a dataset; version is None for datasets without versioned links."""
+        row = self._execute(
+            "SELECT version FROM datasets WHERE dataset_index = ?", (dataset_index,)
+        )
+        return (True, row[0]) if row else (False, None)
+
+    def mark_dataset_done(self, dataset_index, datasource=None, agency=None, version=None, version_name=None):
+        self._execute(
+            "INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?, ?)",
+            (dataset_index, datasource, agency, version, version_name, self._now())
+        )
+
+    def reset(self, datasource):
+        """Forget finished pages and agencies of a datasource (captured datasets are kept)."""
+        self._execute("DELETE FROM pages WHERE datasource = ?", (datasource,))
+        self._execute("DELETE FROM agencies WHERE datasource = ?", (datasource,))
+
+    def seed_from_csv(self, datasource, csv_path):
+        """
+        Register datasets already present in a crawl CSV, from runs before checkpoints existed.
+
+        Only done while the checkpoint knows no datasets of the datasource: crawl rows are
+        written before the meta JSON is downloaded, so later CSVs may list datasets that
+        are still pending.
+        """
+        seeded = 0
+        with self.lock:
+            if self._execute("SELECT 1 FROM datasets WHERE datasource = ? LIMIT 1", (datasource,)):
+                return seeded
+            self.conn.execute("BEGIN")
+            try:
+                for row in read_crawl_rows(csv_path):
+                    dataset_index = dataset_index_from_url(row.get('Data Url', ''))
+                    if not dataset_index:
+                        continue
+                    _, version = parse_data_link(row.get('Data Link', ''))
+                    cursor = self.conn.execute(
+                        "INSERT OR IGNORE INTO datasets VALUES (?, ?, NULL, ?, ?, ?)",
+                        (dataset_index, datasource, version, row.get('Version Name'), self._now())
+                    )
+                    seeded += cursor.rowcount
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return seeded
@@ -6,10 +6,21 @@ import json
 from IPython.core.release import author, author_email
 from torch.fx.experimental.unification.multipledispatch.dispatcher import source
 
-from utils.ckan_utils import clean_keywords, generate_valid_ckan_id
+from utils.ckan_utils import clean_keywords, generate_valid_ckan_id, split_data_extension
 from config import OPENGOV_API_KEY, CKAN_BASE_URL
 from utils.helpers import slugify, transliterate
 
+# Data file extension -> (CKAN resource format, upload mimetype)
+RESOURCE_FORMATS = {
+    '.csv': ('CSV', 'text/csv'),
+    '.parquet': ('Parquet', 'application/vnd.apache.parquet'),
+}
+# Compressed files are uploaded as they are, with the format of the file inside
+COMPRESSED_MIMETYPES = {
+    '.gz': 'application/gzip',
+    '.zst': 'application/zstd',
+}
+
 
 class CKANClient:
     def __init__(self):
@@ -147,6 +158,9 @@ class CKANClient:
         if not dataset_id or not os.path.exists(file_path):
             return False
 
+        _, extension, compressed = split_data_extension(file_name)
+        resource_format, mimetype = RESOURCE_FORMATS.get(extension, RESOURCE_FORMATS['.csv'])
+        mimetype = COMPRESSED_MIMETYPES.get(compressed, mimetype)
         with open(file_path, 'rb') as f:
             return bool(self._make_request(
                 'resource_create',
@@ -155,9 +169,9 @@ class CKANClient:
                     'package_id': dataset_id,
                     'name': file_name,
                     'description': description[:200],
-                    'format': 'CSV'
+                    'format': resource_format
                 },
-                files={'upload': (file_name, f, 'text/csv')}
+                files={'upload': (file_name, f, mimetype)}
             ))
 
     parent_orgs = [
@@ -3,6 +3,9 @@ import os
 import re
 from unidecode import unidecode
 
+# Suffixes of compressed extraction output, e.g. dataset.csv.gz
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
 
 def clean_keywords(keywords):
     """Clean and format keywords for CKAN with Cyrillic support"""
@@ -24,9 +27,27 @@ def clean_keywords(keywords):
     return valid_keywords[:30] or ['government-data']
 
 
+def split_data_extension(filename):
+    """'dataset.csv.gz' -> ('dataset', '.csv', '.gz'); the last part is '' for uncompressed files"""
+    base, suffix = os.path.splitext(os.path.basename(filename))
+    compressed = ''
+    if suffix.lower() in COMPRESSED_SUFFIXES:
+        compressed = suffix.lower()
+        base, suffix = os.path.splitext(base)
+    return base, suffix.lower(), compressed
+
+
+def split_dataset_index(base_name):
+    """'Name__index' -> ('Name', 'index'); extracted files carry the dataset index after a double underscore"""
+    name, separator, index = base_name.rpartition('__')
+    if separator and name and index:
+        return name, index
+    return base_name, None
+
+
 def generate_valid_ckan_id(filename):
     """Generate consistent CKAN IDs from filenames"""
-    base = os.path.splitext(os.path.basename(filename))[0]
+    base, index = split_dataset_index(split_data_extension(filename)[0])
     ascii_name = unidecode(base).lower()
     clean = re.sub(r'[^a-z0-9\-]+', '-', ascii_name).strip('-')
 
@@ -34,7 +55,9 @@ def generate_valid_ckan_id(filename):
     if match := re.match(r'^(\d+)[_\-]', base):
         num_prefix = f"{match.group(1)}-"
 
+    # The index keeps datasets with the same name apart, so it survives the length limit
+    index_suffix = f"-{re.sub(r'[^a-z0-9]+', '-', index.lower()).strip('-')}" if index else ''
     org_prefix = os.path.dirname(filename).split(os.sep)[-1][:3].lower()
-    clean = f"{org_prefix}-{num_prefix}{clean}"[:80]
+    clean = f"{org_prefix}-{num_prefix}{clean}"[:80 - len(index_suffix)] + index_suffix
 
     return clean or f"ds-{hash(filename) % 10000:04d}"
\ No newline at end of file
@@ -0,0 +1,100 @@
+#crawl_pool.py
+import csv
+import glob
+import logging
+import multiprocessing
+import os
+
+CRAWL_CSV_COLUMNS = ['Version Name', 'Data Link', 'Meta Link', 'Data Url']
+PARTS_DIR = "data/parts"
+
+
+def part_path_for(csv_path, worker_id):
+    """Per-worker part file that a crawl worker appends its rows to."""
+    base_name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(PARTS_DIR, f"{base_name}.worker{worker_id}.csv")
+
+
+def claim_next_agency(next_index, agencies):
+    """Atomically take the next agency from the shared work list, or None when it is exhausted."""
+    with next_index.get_lock():
+        position = next_index.value
+        if position >= len(agencies):
+            return None
+        next_index.value += 1
+    return agencies[position]
+
+
+def run_crawl_pool(worker_fn, agencies, workers, *worker_args):
+    """
+    Run worker_fn(worker_id, next_index, agencies, *worker_args) in N processes.
+
+    Agencies are handed out one at a time through a shared counter, so a worker that
+    draws a large agency doesn't hold back the rest of the list.
+    """
+    workers = max(1, min(workers, len(agencies)))
+    next_index = multiprocessing.Value('i', 0)
+
+    if workers == 1:
+        worker_fn(0, next_index, agencies, *worker_args)
+        return
+
+    processes = [
+        multiprocessing.Process(target=worker_fn, args=(worker_id, next_index, agencies, *worker_args))
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            logging.error(f"Crawl worker {process.name} exited with code {process.exitcode}")
+
+
+def _row_key(row):
+    return row.get('Data Url') or row.get('Data Link') or row.get('Version Name')
+
+
+def read_crawl_rows(csv_path):
+    if not os.path.isfile(csv_path):
+        return []
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig') as f:
+        return list(csv.DictReader(f))
+
+
+def merge_crawl_parts(csv_path):
+    """
+    Merge all worker part files of csv_path into it.
+
+    Rows are de-duplicated by dataset URL; a re-crawled dataset keeps its original
+    position but takes the newest values. The target is replaced atomically.
+    """
+    part_paths = sorted(glob.glob(part_path_for(csv_path, '*')))
+    if not part_paths:
+        return 0
+
+    merged = {}
+    for row in read_crawl_rows(csv_path):
+        merged[_row_key(row)] = row
+
+    added = 0
+    for part_path in part_paths:
+        for row in read_crawl_rows(part_path):
+            key = _row_key(row)
+            if key not in merged:
+                added += 1
+            merged[key] = row
+
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=CRAWL_CSV_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for row in merged.values():
+            writer.writerow({col: row.get(col, '') for col in CRAWL_CSV_COLUMNS})
+    os.replace(tmp_path, csv_path)
+
+    for part_path in part_paths:
+        os.remove(part_path)
+
+    logging.info(f"Merged {len(part_paths)} part files into {csv_path}: {added} new rows")
+    return added
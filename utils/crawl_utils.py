@@ -0,0 +1,63 @@
+#crawl_utils.py
+import logging
+from urllib.parse import urljoin
+
+import requests
+from lxml import html as lxml_html
+
+from config import BASE_URL, BASE_SEARCH_URL
+from utils.http_session import get_http_client
+
+DATASET_LINK_XPATH = '//a[starts-with(@href, "/datasets/view?index=")]/@href'
+CAPTCHA_MARKERS = ('id="captchaSuccess"', "id='captchaSuccess'")
+
+
+def http_get(url, **kwargs):
+    """GET through the shared keep-alive client."""
+    kwargs.setdefault('timeout', 20)
+    return get_http_client().get(url, **kwargs)
+
+
+def build_search_url(agency, page):
+    """Build the dataset search URL for one agency page."""
+    return BASE_SEARCH_URL.format(gov_agency_id=agency, page=page)
+
+
+def needs_browser(status_code, page_text):
+    """Check whether a search page response has to be retried through the browser."""
+    if status_code == 502 or "502 Bad Gateway" in page_text:
+        return True
+    return any(marker in page_text for marker in CAPTCHA_MARKERS)
+
+
+def parse_dataset_links(page_text):
+    """Extract absolute dataset view links from a search page, keeping page order."""
+    tree = lxml_html.fromstring(page_text)
+    links = [urljoin(BASE_URL, href) for href in tree.xpath(DATASET_LINK_XPATH)]
+    return list(dict.fromkeys(links))
+
+
+def fetch_dataset_links(agency, page, timeout=20):
+    """
+    Fetch dataset links of a search page over plain HTTP.
+
+    Returns a (possibly empty) list of links, or None when the page hit a CAPTCHA,
+    a 502 or a network error and should be loaded with the browser instead.
+    """
+    search_url = build_search_url(agency, page)
+    try:
+        # One retry only: a page that keeps failing goes to the browser instead
+        response = http_get(search_url, timeout=timeout, retries=1)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"HTTP crawl failed for {search_url}: {e}")
+        return None
+
+    if needs_browser(response.status_code, response.text):
+        logging.info(f"CAPTCHA or 502 on {search_url}, browser fallback required")
+        return None
+
+    if response.status_code != 200:
+        logging.warning(f"HTTP {response.status_code} for {search_url}")
+        return None
+
+    return parse_dataset_links(response.text)
@@ -0,0 +1,96 @@
+#driver_supervisor.py
+import logging
+import time
+
+from config import CHROME_HEADLESS, CHROME_LEAN, DRIVER_MAX_PAGES, DRIVER_MAX_MEMORY_MB
+from utils.selenium_utils import RESTART_STATS, is_session_valid, page_load_report, restart_chrome
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MEMORY_CHECK_EVERY = 25  # pages between memory probes
+
+
+class DriverSupervisor:
+    """Owns the process' Chrome instance: starts it lazily, restarts it and recycles it proactively."""
+
+    def __init__(self, headless=CHROME_HEADLESS, lean=CHROME_LEAN, max_pages=DRIVER_MAX_PAGES,
+                 max_memory_mb=DRIVER_MAX_MEMORY_MB):
+        self.headless = headless
+        self.lean = lean
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.driver = None
+        self.pages_on_driver = 0
+        self.pages_total = 0
+        self.recycles = 0
+        self.started_at = time.monotonic()
+
+    def acquire(self):
+        """Return a live driver, replacing it first if it is dead or due for recycling."""
+        if self.driver is None:
+            return self.restart("start")
+        if self.max_pages and self.pages_on_driver >= self.max_pages:
+            self.recycles += 1
+            return self.restart(f"recycle after {self.pages_on_driver} pages")
+        if self.pages_on_driver and self.pages_on_driver % MEMORY_CHECK_EVERY == 0:
+            memory_mb = self.memory_mb()
+            if memory_mb and memory_mb > self.max_memory_mb:
+                self.recycles += 1
+                return self.restart(f"recycle at {memory_mb:.0f} MB")
+        if not is_session_valid(self.driver):
+            return self.restart("dead session")
+        return self.driver
+
+    def page_done(self):
+        self.pages_on_driver += 1
+        self.pages_total += 1
+
+    def restart(self, reason=""):
+        logging.info(f"Restarting Chrome ({reason})")
+        self.quit()
+        self.driver = restart_chrome(headless=self.headless, lean=self.lean)
+        return self.driver
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.driver = None
+        self.pages_on_driver = 0
+
+    def memory_mb(self):
+        """Resident memory of chromedriver and its browser processes, or the JS heap without psutil."""
+        try:
+            if psutil is not None:
+                process = psutil.Process(self.driver.service.process.pid)
+                tree = [process] + process.children(recursive=True)
+                return sum(p.memory_info().rss for p in tree) / (1024 * 1024)
+            heap = self.driver.execute_script("return performance.memory && performance.memory.usedJSHeapSize")
+            return (heap or 0) / (1024 * 1024)
+        except Exception:
+            return None
+
+    def report(self):
+        elapsed = time.monotonic() - self.started_at
+        share = RESTART_STATS['seconds'] / elapsed * 100 if elapsed else 0
+        return (
+            f"Chrome: {RESTART_STATS['restarts']} starts ({self.recycles} recycles, "
+            f"{RESTART_STATS['failures']} failures), {RESTART_STATS['seconds']:.1f}s starting "
+            f"({share:.1f}% of {elapsed:.0f}s), {self.pages_total} pages. {page_load_report()}"
+        )
+
+
+_supervisor = None
+
+
+def get_supervisor():
+    """Per-process supervisor shared by the crawl loop and the recovery helpers."""
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = DriverSupervisor()
+    return _supervisor
@@ -0,0 +1,68 @@
+#error_ledger.py
+import csv
+import os
+
+LEDGER_FIELDS = ['timestamp', 'agency', 'url', 'dataset_name', 'error_type', 'error_message', 'status_code']
+
+# Failures that won't go away by asking again
+PERMANENT_STATUS_CODES = {'400', '401', '403', '404', '410'}
+NETWORK_ERROR_PREFIX = 'Request failed'
+
+
+def ledger_key(agency, url, dataset_name):
+    return agency, str(url), dataset_name
+
+
+def read_ledger(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def latest_failures(rows):
+    """Last ledger row per (agency, url, dataset), in first-seen order."""
+    latest = {}
+    for row in rows:
+        latest[ledger_key(row['agency'], row['url'], row['dataset_name'])] = row
+    return latest
+
+
+def is_retryable(row):
+    """
+    Whether a logged failure is worth another attempt.
+
+    API errors, save failures, unexpected errors and network errors (timeouts, resets)
+    are retried; invalid links, 404s, datasets the API reported as empty and offline
+    cache misses are not.
+    """
+    error_type = row.get('error_type')
+    if error_type == 'offline_miss':
+        return False
+    status_code = (row.get('status_code') or '').split('.')[0]
+    if status_code in PERMANENT_STATUS_CODES:
+        return False
+    if error_type in ('api_error', 'save_failed', 'unexpected_error'):
+        return True
+    if error_type == 'empty_response':
+        # fetch_api_data reports network errors as empty responses without a status code
+        return (row.get('error_message') or '').startswith(NETWORK_ERROR_PREFIX)
+    return False
+
+
+def write_ledger(path, rows):
+    """Replace the ledger atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def compact_ledger(path, resolved=()):
+    """Drop resolved datasets and keep only the latest failure of the rest; returns rows kept."""
+    resolved = set(resolved)
+    rows = [row for key, row in latest_failures(read_ledger(path)).items() if key not in resolved]
+    write_ledger(path, rows)
+    return len(rows)
@@ -0,0 +1,119 @@
+#extraction_manifest.py
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+FLUSH_EVERY = 50
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class JsonManifest:
+    """A JSON object of per-dataset entries keyed by dataset index, flushed every FLUSH_EVERY updates."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def get(self, index):
+        with self.lock:
+            return self.entries.get(index)
+
+    def put(self, index, entry):
+        with self.lock:
+            self.entries[index] = entry
+            self.pending += 1
+            flush = self.pending >= FLUSH_EVERY
+        if flush:
+            self.save()
+        return entry
+
+    def save(self):
+        """Write the manifest atomically."""
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.pending = 0
+
+
+class ExtractionManifest(JsonManifest):
+    """
+    What was extracted last time, keyed by dataset index.
+
+    Each entry holds the version, row count, byte size, mtime and sha256 of the written
+    file, so a dataset whose Data Link still points at the same version and whose file
+    is intact on disk doesn't have to be downloaded again.
+    """
+
+    def is_current(self, index, version, filepath, verify=False):
+        """
+        True when the last extraction of this index was this version and its file is unchanged.
+
+        A file with the recorded size and mtime is taken as unchanged; the sha256 is only
+        computed when the mtime differs, or for every file with verify.
+        """
+        entry = self.get(index)
+        if not entry or entry.get('version') != version or not os.path.exists(filepath):
+            return False
+        stat = os.stat(filepath)
+        if stat.st_size != entry.get('bytes'):
+            return False
+        if not verify and stat.st_mtime_ns == entry.get('mtime_ns'):
+            return True
+        if file_sha256(filepath) != entry.get('sha256'):
+            return False
+        if stat.st_mtime_ns != entry.get('mtime_ns'):
+            # Same content under a new mtime (a copy or touch): remember it so the next run is cheap
+            self.put(index, {**entry, 'mtime_ns': stat.st_mtime_ns})
+        return True
+
+    def record(self, index, version, filepath, rows, **extra):
+        stat = os.stat(filepath)
+        entry = {
+            'version': version,
+            'rows': rows,
+            'bytes': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_sha256(filepath),
+            'path': str(filepath),
+            'extracted_at': datetime.now().isoformat(),
+            **extra
+        }
+        return self.put(index, entry)
+
+
+class SizeManifest(JsonManifest):
+    """Record counts from the planning probe, keyed by dataset index."""
+
+    def records(self, index, version, max_age=None):
+        """Probed count of this version, or None if unknown (or older than max_age seconds)."""
+        entry = self.get(index)
+        if not entry or entry.get('version') != version:
+            return None
+        if max_age is not None and time.time() - entry.get('probed_at', 0) > max_age:
+            return None
+        return entry.get('records')
+
+    def hint(self, index):
+        """Last probed count of any version, a good starting point for the next probe."""
+        entry = self.get(index)
+        return entry.get('records') if entry else None
+
+    def record_size(self, index, version, records):
+        return self.put(index, {'version': version, 'records': records, 'probed_at': time.time()})
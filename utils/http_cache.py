@@ -0,0 +1,185 @@
+#http_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_DIR = "data/http_cache"
+CACHE_MODES = ("off", "on", "offline")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    cache_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+"""
+
+# Response headers worth replaying; hop-by-hop and encoding headers don't apply to the stored body
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'X-Version-Name', 'X-Version-Description',
+                'X-Version-Keywords')
+
+
+def cache_key_url(url):
+    """The URL without its apiKey and with sorted query parameters, so keys don't depend on credentials."""
+    parsed = urlparse(url)
+    query = sorted((key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+                   if key.lower() != 'apikey')
+    return urlunparse(parsed._replace(query=urlencode(query), fragment=''))
+
+
+def cached_response(url, status_code, headers, body):
+    """A requests.Response rebuilt from stored parts; from_cache tells it apart from a live one."""
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.url = url
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers) or 'utf-8'
+    response.from_cache = True
+    return response
+
+
+class HttpCache:
+    """
+    On-disk cache of successful GET responses.
+
+    Bodies live in files under the cache directory and a SQLite index keeps their
+    validators and access times. Entries younger than ttl are served as they are, older
+    ones are revalidated with If-None-Match / If-Modified-Since, and the least recently
+    used entries are evicted once the bodies exceed max_bytes.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=24 * 3600, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.body_dir = os.path.join(cache_dir, "bodies")
+        os.makedirs(self.body_dir, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), timeout=60,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def key_for(self, url):
+        return hashlib.sha256(cache_key_url(url).encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.body_dir, key[:2], key)
+
+    def lookup(self, url):
+        """The stored entry for a URL as a dict (with 'fresh' and 'response'), or None."""
+        key = self.key_for(url)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status_code, headers, etag, last_modified, stored_at FROM responses WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                body = f.read()
+        except OSError:
+            self.delete(key)
+            return None
+
+        status_code, headers, etag, last_modified, stored_at = row
+        with self.lock:
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE cache_key = ?", (time.time(), key))
+        return {
+            'key': key,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fresh': time.time() - stored_at < self.ttl,
+            'response': cached_response(url, status_code, json.loads(headers), body),
+        }
+
+    def validators(self, entry):
+        """Conditional request headers for a stale entry."""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, entry):
+        """A 304 answer: the stored body is current again."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE cache_key = ?",
+                              (now, now, entry['key']))
+        self._count('revalidated')
+
+    def store(self, url, response):
+        key = self.key_for(url)
+        body = response.content
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, cache_key_url(url), response.status_code, json.dumps(headers, ensure_ascii=False),
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), len(body), now, now)
+            )
+        self._count('stored')
+        self.evict()
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses WHERE cache_key = ?", (key,))
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Drop least recently used entries until the bodies fit in 90% of max_bytes."""
+        with self.lock:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            target = self.max_bytes * 0.9
+            victims = []
+            for key, size in self.conn.execute("SELECT cache_key, size FROM responses ORDER BY accessed_at"):
+                if total <= target:
+                    break
+                victims.append(key)
+                total -= size
+        for key in victims:
+            self.delete(key)
+            self._count('evicted')
+
+    def report(self):
+        with self.lock:
+            return ", ".join(f"{count} {name}" for name, count in self.stats.items())
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,186 @@
+#http_session.py
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    HEADERS, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, HTTP_POOL_SIZE,
+    HTTP_CACHE_DIR, HTTP_CACHE_TTL, HTTP_CACHE_MAX_MB
+)
+from utils.http_cache import HttpCache, cached_response
+from utils.rate_limit import get_rate_limiter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(response):
+    """Delay requested by a Retry-After header (seconds or HTTP date), or None."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, response=None, base=HTTP_BACKOFF_BASE, maximum=HTTP_BACKOFF_MAX):
+    """Retry-After if the response asks for it, else full-jitter exponential backoff; capped at maximum."""
+    delay = retry_after_seconds(response)
+    if delay is None:
+        delay = random.uniform(0, min(maximum, base * 2 ** attempt))
+    return min(delay, maximum)
+
+
+class HttpClient:
+    """
+    Keep-alive session shared by the crawler, the extractor and the metadata downloader.
+
+    Requests go through the host rate limiter; timeouts, connection errors and 429/5xx
+    answers are retried with full-jitter exponential backoff, honouring Retry-After.
+    Latency and retry counts are kept per host. Callers that pass cache=True are served
+    from the on-disk cache once it is enabled with configure_cache().
+    """
+
+    def __init__(self, max_retries=HTTP_MAX_RETRIES, backoff_base=HTTP_BACKOFF_BASE,
+                 backoff_max=HTTP_BACKOFF_MAX, pool_size=HTTP_POOL_SIZE):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.cache = None
+        self.cache_mode = "off"
+
+    def configure_cache(self, mode="on", ttl=HTTP_CACHE_TTL, max_mb=HTTP_CACHE_MAX_MB, cache_dir=HTTP_CACHE_DIR):
+        """'on' caches and revalidates, 'offline' serves only from the cache, 'off' disables it."""
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        self.cache_mode = mode
+        if mode != "off":
+            self.cache = HttpCache(cache_dir, ttl=ttl, max_bytes=max_mb * 1024 * 1024)
+
+    def _record(self, host, **increments):
+        with self.lock:
+            stats = self.metrics.setdefault(
+                host, {'requests': 0, 'retries': 0, 'failures': 0, 'latency': 0.0, 'backoff': 0.0}
+            )
+            for key, value in increments.items():
+                stats[key] += value
+
+    def _backoff(self, attempt, response=None):
+        return backoff_delay(attempt, response, self.backoff_base, self.backoff_max)
+
+    def request(self, method, url, retries=None, cache=False, **kwargs):
+        """Send a request with retries; returns the last response or raises the last network error."""
+        if cache and self.cache is not None and method == 'GET':
+            return self._cached_get(url, retries, **kwargs)
+        return self._send(method, url, retries, **kwargs)
+
+    def _cached_get(self, url, retries, **kwargs):
+        entry = self.cache.lookup(url)
+        if entry and (entry['fresh'] or self.cache_mode == "offline"):
+            self.cache._count('hits')
+            return entry['response']
+        if self.cache_mode == "offline":
+            self.cache._count('misses')
+            response = cached_response(url, 504, {'Content-Type': 'text/plain'}, b'Offline mode: not in the HTTP cache')
+            # Asking again won't help without network; callers report it as its own outcome
+            response.offline_miss = True
+            return response
+
+        if entry:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **self.cache.validators(entry)}
+        response = self._send('GET', url, retries, **kwargs)
+        if entry and response.status_code == 304:
+            self.cache.touch(entry)
+            return entry['response']
+        self.cache._count('misses')
+        if response.status_code == 200:
+            self.cache.store(url, response)
+        return response
+
+    def _send(self, method, url, retries=None, **kwargs):
+        kwargs.setdefault('timeout', 30)
+        retries = self.max_retries if retries is None else retries
+        parsed = urlparse(url)
+        host = parsed.netloc
+        # Logged without the query string, which carries the API key
+        label = parsed._replace(query='').geturl()
+
+        for attempt in range(retries + 1):
+            get_rate_limiter().wait(url)
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                self._record(host, requests=1, latency=time.monotonic() - started)
+                if attempt == retries:
+                    self._record(host, failures=1)
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"{e.__class__.__name__} for {label}, retrying in {delay:.1f}s")
+            else:
+                self._record(host, requests=1, latency=time.monotonic() - started)
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    if response.status_code in RETRY_STATUSES:
+                        self._record(host, failures=1)
+                    return response
+                delay = self._backoff(attempt, response)
+                logging.warning(f"HTTP {response.status_code} for {label}, retrying in {delay:.1f}s")
+
+            self._record(host, retries=1, backoff=delay)
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def report(self):
+        with self.lock:
+            report = "; ".join(
+                f"{host}: {stats['requests']} requests, {stats['latency'] / max(stats['requests'], 1) * 1000:.0f} ms avg, "
+                f"{stats['retries']} retries ({stats['backoff']:.1f}s backoff), {stats['failures']} failures"
+                for host, stats in sorted(self.metrics.items())
+            )
+        if self.cache is not None:
+            report = f"{report}; cache ({self.cache_mode}): {self.cache.report()}"
+        return report
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Per-process shared client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+    return _client
+
+
+def http_get(url, **kwargs):
+    return get_http_client().get(url, **kwargs)
+
+
+def configure_cache(mode="on", ttl=HTTP_CACHE_TTL, max_mb=HTTP_CACHE_MAX_MB):
+    get_http_client().configure_cache(mode, ttl=ttl, max_mb=max_mb)
@@ -0,0 +1,143 @@
+#link_resolver.py
+import re
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from config import BASE_URL
+from utils.crawl_utils import http_get
+from utils.page_parser import DatasetPage
+
+VERSIONED_LINK_RE = re.compile(r'/(?:api/v4|meta)/([^/?#]+)/v(\d+)')
+MAX_VERSION = 1000
+
+
+def dataset_index_from_url(dataset_url):
+    """Dataset index from a /datasets/view?index=... URL."""
+    values = parse_qs(urlparse(dataset_url).query).get('index')
+    return values[0] if values else None
+
+
+def parse_data_link(link):
+    """(index, version) from an api/v4 or meta link, or (None, None)."""
+    match = VERSIONED_LINK_RE.search(link or "")
+    if not match:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+def build_data_link(index, version):
+    return f"{BASE_URL}/api/v4/{index}/v{version}?apiKey=yourApiKey"
+
+
+def build_meta_link(index, version):
+    return f"{BASE_URL}/meta/{index}/v{version}?pretty"
+
+
+def fetch_meta(index, version):
+    """
+    Meta JSON of one dataset version, or None if that version doesn't exist.
+
+    Only a 404 or an empty answer means the version is missing. Timeouts and other error
+    statuses (after the client's retries) raise, so a transient failure during the search
+    can't pass for a missing version and resolve the dataset to an older one.
+    """
+    response = http_get(f"{BASE_URL}/meta/{index}/v{version}", timeout=20, cache=True)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise requests.exceptions.HTTPError(
+            f"Meta probe failed for {index} v{version}: HTTP {response.status_code}", response=response
+        )
+    try:
+        metadata = response.json()
+    except ValueError:
+        return None
+    return metadata if isinstance(metadata, dict) and metadata else None
+
+
+def has_newer_version(index, version):
+    """One probe: does the version after the given one exist?"""
+    return fetch_meta(index, version + 1) is not None
+
+
+def find_latest_version(index, hint=1):
+    """
+    Find the newest published version of a dataset by probing the meta endpoint.
+
+    Starting from a known version, it gallops upwards until a version is missing and
+    then bisects, so a dataset at v40 costs about a dozen small requests.
+    Returns (version, meta JSON) or (None, None) when the dataset has no meta at all;
+    a failed probe raises rather than cutting the search short.
+    """
+    hint = max(1, hint or 1)
+    metadata = fetch_meta(index, hint)
+    if metadata is None and hint > 1:
+        hint = 1
+        metadata = fetch_meta(index, hint)
+    if metadata is None:
+        return None, None
+
+    low, low_meta = hint, metadata
+    step = 1
+    high = None
+    while low + step <= MAX_VERSION:
+        candidate_meta = fetch_meta(index, low + step)
+        if candidate_meta is None:
+            high = low + step
+            break
+        low, low_meta = low + step, candidate_meta
+        step *= 2
+    if high is None:
+        return low, low_meta
+
+    while high - low > 1:
+        middle = (low + high) // 2
+        middle_meta = fetch_meta(index, middle)
+        if middle_meta is None:
+            high = middle
+        else:
+            low, low_meta = middle, middle_meta
+    return low, low_meta
+
+
+def _owner_name(metadata):
+    owner = metadata.get('owner') or {}
+    if not isinstance(owner, dict):
+        return str(owner)
+    return owner.get('fullnameRu') or owner.get('nameRu') or owner.get('shortNameRu') or ""
+
+
+def resolve_dataset_links(dataset_url, hint=1):
+    """
+    Build the data and meta links of a dataset from its index, without the view page.
+
+    Returns (DatasetPage, meta JSON), or (None, None) when the dataset has to be read
+    in the browser (proxy-only datasets have no versioned meta).
+    """
+    index = dataset_index_from_url(dataset_url)
+    if not index:
+        return None, None
+
+    version, metadata = find_latest_version(index, hint)
+    if version is None:
+        return None, None
+
+    version_name = metadata.get('nameRu') or metadata.get('title') or metadata.get('name') or ""
+    if not version_name:
+        return None, None
+
+    keywords = metadata.get('keywords') or ""
+    if isinstance(keywords, list):
+        keywords = ", ".join(str(keyword) for keyword in keywords)
+
+    page = DatasetPage(
+        dataset_url=dataset_url,
+        version_name=version_name.strip(),
+        data_link=build_data_link(index, version),
+        meta_link=build_meta_link(index, version),
+        description=metadata.get('descriptionRu') or metadata.get('description') or "",
+        owner=_owner_name(metadata),
+        keywords=keywords,
+    )
+    return page, metadata
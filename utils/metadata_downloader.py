@@ -0,0 +1,93 @@
+#metadata_downloader.py
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from utils.http_session import get_http_client
+from utils.selenium_utils import normalize_filename
+
+METADATA_DIR = "results/metadata"
+META_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+    "Accept": "application/json"
+}
+
+
+def write_metadata_json(metadata, output_dir, version_name):
+    os.makedirs(output_dir, exist_ok=True)
+    full_path = os.path.join(output_dir, normalize_filename(version_name) + ".json")
+    with open(full_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    return full_path
+
+
+class MetadataDownloader:
+    """
+    Downloads meta JSON in background threads over the shared HTTP client.
+
+    At most workers * 4 downloads are queued; submit() blocks beyond that so a slow
+    meta endpoint throttles the crawl instead of growing the queue without bound.
+    on_saved callbacks run in the download thread, only after the JSON was saved.
+    """
+
+    def __init__(self, output_dir=METADATA_DIR, workers=4, max_retries=3, timeout=20):
+        self.output_dir = output_dir
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.client = get_http_client()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="metadata")
+        self.slots = threading.BoundedSemaphore(workers * 4)
+        self.lock = threading.Lock()
+        self.stats = {'saved': 0, 'failed': 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def download(self, meta_link, version_name):
+        """Fetch one meta link (the client retries 5xx and timeouts) and save it; returns the saved path."""
+        try:
+            response = self.client.get(meta_link, headers=META_HEADERS, timeout=self.timeout,
+                                       retries=self.max_retries, cache=True)
+            if response.status_code == 200:
+                path = write_metadata_json(response.json(), self.output_dir, version_name)
+                self._count('saved')
+                return path
+            logging.warning(f"Metadata download failed with HTTP {response.status_code}: {meta_link}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.warning(f"Error downloading {meta_link}: {e}")
+
+        self._count('failed')
+        return None
+
+    def _run(self, meta_link, version_name, on_saved):
+        try:
+            path = self.download(meta_link, version_name)
+            if path and on_saved:
+                on_saved()
+            return path
+        except Exception as e:
+            logging.warning(f"Completion of {meta_link} failed: {e}")
+            return None
+        finally:
+            self.slots.release()
+
+    def submit(self, meta_link, version_name, on_saved=None):
+        """Queue a download; the future resolves to the saved path, or None if it failed."""
+        self.slots.acquire()
+        return self.executor.submit(self._run, meta_link, version_name, on_saved)
+
+    def close(self):
+        """Wait for queued downloads to finish."""
+        self.executor.shutdown(wait=True)
+        logging.info(f"Metadata downloads: {self.stats['saved']} saved, {self.stats['failed']} failed")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,337 @@
+#output_formats.py
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PARQUET_AVAILABLE = pa is not None
+ZSTD_AVAILABLE = zstandard is not None
+OUTPUT_FORMATS = ('csv', 'parquet')
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet'}
+# CSV compression; Parquet compresses its pages itself
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+ZSTD_LEVEL = 6
+PARQUET_COMPRESSION = 'zstd'
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+
+class _ColumnConflict(Exception):
+    """A later chunk doesn't fit the type inferred for a column from earlier chunks."""
+
+    def __init__(self, column):
+        super().__init__(column)
+        self.column = column
+
+
+def _as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _infer_array(values):
+    """Arrow array with an inferred type; all-null and mixed-type columns become strings."""
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([_as_text(value) for value in values], type=pa.string())
+    if pa.types.is_null(array.type):
+        return pa.array(values, type=pa.string())
+    return array
+
+
+def _write_chunks(chunks, columns, tmp_path, text_columns, row_group_size):
+    schema = None
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            arrays = []
+            for column in columns:
+                values = [row.get(column) for row in chunk]
+                if column in text_columns:
+                    arrays.append(pa.array([_as_text(value) for value in values], type=pa.string()))
+                elif schema is None:
+                    arrays.append(_infer_array(values))
+                else:
+                    try:
+                        arrays.append(pa.array(values, type=schema.field(column).type))
+                    except (pa.ArrowInvalid, pa.ArrowTypeError):
+                        raise _ColumnConflict(column)
+            if schema is None:
+                schema = pa.schema([pa.field(column, array.type) for column, array in zip(columns, arrays)])
+                # Dictionary pages keep repetitive Cyrillic category columns small
+                writer = pq.ParquetWriter(tmp_path, schema, compression=PARQUET_COMPRESSION, use_dictionary=True)
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=row_group_size)
+            rows += len(chunk)
+        if writer is None:
+            pq.write_table(pa.table({column: pa.array([], type=pa.string()) for column in columns}), tmp_path,
+                           compression=PARQUET_COMPRESSION)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_parquet(make_chunks, columns, filepath, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Write rows to a zstd-compressed Parquet file with an inferred schema.
+
+    make_chunks() yields lists of row dicts of at most row_group_size rows. Column types
+    are inferred from the first chunk; if a later chunk doesn't fit, that column is
+    widened to string and make_chunks() is replayed. Returns the number of rows written.
+    """
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+    columns = list(columns)
+    tmp_path = f"{filepath}.part"
+    text_columns = set()
+    while True:
+        try:
+            rows = _write_chunks(make_chunks(), columns, tmp_path, text_columns, row_group_size)
+            break
+        except _ColumnConflict as conflict:
+            text_columns.add(conflict.column)
+    os.replace(tmp_path, filepath)
+    return rows
+
+
+def chunked(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def iter_jsonl_chunks(path, size):
+    """Read a JSON-lines spool back as lists of at most size records."""
+    chunk = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            chunk.append(json.loads(line))
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def compression_for(path):
+    """Compression of a file, judged by its suffix."""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and str(path).endswith(suffix):
+            return compression
+    return 'none'
+
+
+def compress_bytes(data, compression):
+    """One self-contained gzip member / zstd frame; concatenated ones decompress as one stream."""
+    if compression == 'gzip':
+        return gzip.compress(data)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def open_binary(path, mode='rb', compression=None):
+    """Open a plain, gzip or zstd file as a byte stream, picking the codec from the suffix by default."""
+    compression = compression or compression_for(path)
+    if compression == 'gzip':
+        return gzip.open(path, mode)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd files need zstandard: pip install zstandard")
+        fh = open(path, mode)
+        if 'r' in mode:
+            return zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True, closefd=True)
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(fh, closefd=True)
+    return open(path, mode)
+
+
+def open_text(path, mode='r', compression=None, encoding='utf-8'):
+    """Text stream over open_binary, with newline='' as the csv module expects."""
+    return io.TextIOWrapper(open_binary(path, mode + 'b', compression), encoding=encoding, newline='')
+
+
+def _iter_csv_records(f):
+    """
+    Yield raw CSV records (with their line terminator) from a file opened with newline=''.
+
+    The csv module doubles quotes inside fields, so a record ends at the first line break
+    where the number of quote characters seen so far is even.
+    """
+    record = ''
+    for line in f:
+        record += line
+        if record.count('"') % 2 == 0:
+            yield record
+            record = ''
+    if record:
+        yield record
+
+
+class StreamingCSVWriter:
+    """
+    Write dict rows to CSV as they arrive, discovering the column set on the way.
+
+    Rows go to a body file under the columns known so far; a record with a new key
+    appends the column and starts a new segment. close() writes the header and copies
+    the body behind it, padding the rows of earlier, narrower segments, so only the
+    current record is ever held in memory.
+
+    With gzip or zstd the body is compressed as it is written. The header becomes a
+    separate gzip member / zstd frame in front of it, so when no padding is needed the
+    compressed body is copied as it is.
+    """
+
+    def __init__(self, filepath, encoding='utf-8-sig', quoting=csv.QUOTE_NONNUMERIC, compression='none'):
+        self.filepath = str(filepath)
+        self.body_path = f"{self.filepath}.body"
+        self.encoding = encoding
+        self.quoting = quoting
+        self.compression = compression
+        self.columns = []
+        self.known = set()
+        self.rows = 0
+        # (first row, width) of each run of rows written under the same columns
+        self.segments = []
+        self.body = open_text(self.body_path, 'w', compression)
+        self.writer = csv.writer(self.body, quoting=quoting)
+
+    def write_rows(self, records):
+        for record in records:
+            if not isinstance(record, dict):
+                record = {'value': record}
+            new_keys = [key for key in record if key not in self.known]
+            if new_keys:
+                self.columns.extend(new_keys)
+                self.known.update(new_keys)
+                self.segments.append((self.rows, len(self.columns)))
+            self.writer.writerow([record.get(column) for column in self.columns])
+            self.rows += 1
+
+    def _needs_padding(self):
+        width = len(self.columns)
+        return any(segment_width != width for _, segment_width in self.segments)
+
+    def _copy_padded_body(self, out):
+        """Re-encode the body, giving rows written before later columns appeared empty trailing fields."""
+        width = len(self.columns)
+        boundaries = [start for start, _ in self.segments[1:]] + [self.rows]
+        padding = [',""' * (width - segment_width) for _, segment_width in self.segments]
+        segment = 0
+        with open_text(self.body_path, 'r', self.compression) as body:
+            for row_number, record in enumerate(_iter_csv_records(body)):
+                while row_number >= boundaries[segment]:
+                    segment += 1
+                if padding[segment]:
+                    body_text = record.rstrip('\r\n')
+                    record = body_text + padding[segment] + record[len(body_text):]
+                out.write(record)
+
+    def close(self):
+        """Write the final file (header first) and return the number of rows."""
+        self.body.close()
+        tmp_path = f"{self.filepath}.part"
+        header = io.StringIO()
+        csv.writer(header, quoting=self.quoting).writerow(self.columns)
+        try:
+            if self._needs_padding():
+                with open_text(tmp_path, 'w', self.compression, encoding=self.encoding) as out:
+                    out.write(header.getvalue())
+                    self._copy_padded_body(out)
+            else:
+                with open(tmp_path, 'wb') as out, open(self.body_path, 'rb') as body:
+                    out.write(compress_bytes(header.getvalue().encode(self.encoding), self.compression))
+                    shutil.copyfileobj(body, out)
+            os.replace(tmp_path, self.filepath)
+        finally:
+            for path in (tmp_path, self.body_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        return self.rows
+
+    def abort(self):
+        """Drop everything written so far."""
+        self.body.close()
+        if os.path.exists(self.body_path):
+            os.remove(self.body_path)
+
+
+class ParquetSpoolWriter:
+    """
+    Same interface as StreamingCSVWriter for Parquet output.
+
+    The schema has to be known before the first row group is written, so rows are
+    spooled to JSON lines and converted row group by row group on close().
+    """
+
+    def __init__(self, filepath, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        self.filepath = str(filepath)
+        self.spool_path = f"{self.filepath}.jsonl"
+        self.row_group_size = row_group_size
+        self.columns = []
+        self.known = set()
+        self.rows = 0
+        self.spool = open(self.spool_path, 'w', encoding='utf-8')
+
+    def write_rows(self, records):
+        for record in records:
+            if not isinstance(record, dict):
+                record = {'value': record}
+            for key in record:
+                if key not in self.known:
+                    self.columns.append(key)
+                    self.known.add(key)
+            self.spool.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.rows += 1
+
+    def close(self):
+        self.spool.close()
+        try:
+            return write_parquet(lambda: iter_jsonl_chunks(self.spool_path, self.row_group_size),
+                                 self.columns, self.filepath, self.row_group_size)
+        finally:
+            os.remove(self.spool_path)
+
+    def abort(self):
+        self.spool.close()
+        if os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+
+
+def dataset_extension(output_format='csv', compression='none'):
+    if output_format == 'parquet':
+        return EXTENSIONS['parquet']
+    return EXTENSIONS['csv'] + COMPRESSION_SUFFIXES[compression]
+
+
+def dataset_stem(filename):
+    """File name without its dataset extension ('a.csv.gz' -> 'a')."""
+    filename = os.path.basename(str(filename))
+    for extension in sorted({dataset_extension(fmt, comp) for fmt in OUTPUT_FORMATS for comp in COMPRESSIONS},
+                            key=len, reverse=True):
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return filename
+
+
+def open_dataset_writer(filepath, output_format='csv', row_group_size=DEFAULT_ROW_GROUP_SIZE, compression='none'):
+    """Streaming writer for one dataset file: write_rows() per page, then close() or abort()."""
+    if output_format == 'parquet':
+        return ParquetSpoolWriter(filepath, row_group_size)
+    return StreamingCSVWriter(filepath, compression=compression)
@@ -0,0 +1,100 @@
+#page_parser.py
+from dataclasses import dataclass
+from urllib.parse import urljoin
+
+from lxml import html as lxml_html
+
+from config import BASE_URL
+
+
+@dataclass
+class DatasetPage:
+    """Everything the crawler reads from a /datasets/view page."""
+    dataset_url: str
+    version_name: str = ""
+    data_link: str = ""
+    meta_link: str = ""
+    description: str = ""
+    owner: str = ""
+    categories: str = ""
+    keywords: str = ""
+
+    @property
+    def is_proxy(self):
+        return "/proxy/" in self.data_link
+
+    def to_metadata(self):
+        return {
+            "Dataset URL": self.dataset_url,
+            "Version Name": self.version_name,
+            "Data Link": self.data_link,
+            "Meta Link": self.meta_link,
+        }
+
+    def to_base_metadata(self):
+        return {
+            "Dataset URL": self.dataset_url,
+            "Version Name": self.version_name,
+            "Version Description": self.description,
+            "Version Owner": self.owner,
+            "Categories": self.categories,
+            "Keywords": self.keywords,
+        }
+
+
+def _text(nodes):
+    for node in nodes:
+        text = " ".join(node.text_content().split())
+        if text:
+            return text
+    return ""
+
+
+def _href(nodes):
+    for href in nodes:
+        if href and href.strip():
+            return urljoin(BASE_URL, href.strip())
+    return ""
+
+
+def _class_xpath(tag, class_name):
+    return f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+
+def _labelled_cell(tree, label):
+    return tree.xpath(f"//td[contains(., '{label}')]/following-sibling::td")
+
+
+def parse_dataset_page(page_source, dataset_url):
+    """Parse a dataset view page in one pass; missing fields are left empty."""
+    tree = lxml_html.fromstring(page_source)
+
+    return DatasetPage(
+        dataset_url=dataset_url,
+        version_name=(
+            _text(tree.xpath('//*[@id="versionName"]'))
+            or _text(tree.xpath(_class_xpath('h1', 'dataset-title')))
+            or _text(_labelled_cell(tree, 'Наименование'))
+        ),
+        data_link=(
+            _href(tree.xpath('//a[contains(@href, "api/v4/")]/@href'))
+            or _href(tree.xpath('//a[contains(@href, "/proxy/")]/@href'))
+        ),
+        meta_link=_href(tree.xpath('//td[@id="metaLink"]//a/@href | //a[contains(@class, "meta-link")]/@href')),
+        description=(
+            _text(tree.xpath('//*[@id="versionDescription"]'))
+            or _text(_labelled_cell(tree, 'Описание'))
+        ),
+        owner=(
+            _text(tree.xpath('//*[@id="versionOwner"]'))
+            or _text(_labelled_cell(tree, 'Владелец'))
+        ),
+        categories=(
+            _text(_labelled_cell(tree, 'Категории'))
+            or _text(tree.xpath(_class_xpath('*', 'dataset-categories')))
+        ),
+        keywords=(
+            _text(tree.xpath('//*[@id="Keywords"]'))
+            or _text(_labelled_cell(tree, 'Ключевые слова'))
+        ),
+    )
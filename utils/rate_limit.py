@@ -0,0 +1,58 @@
+#rate_limit.py
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+from config import API_RATE_LIMIT
+
+
+class HostRateLimiter:
+    """Thread-safe token bucket per host; wait() blocks until a request to that host is allowed."""
+
+    def __init__(self, rate=API_RATE_LIMIT, burst=None):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """Requests per second per host; 0 or None disables limiting."""
+        with self.lock:
+            self.rate = rate or 0
+            self.burst = burst or max(1, int(self.rate))
+            self.buckets = {}
+
+    def reserve(self, url):
+        """Take the next slot for the url's host and return how long to wait before using it."""
+        if not self.rate:
+            return 0.0
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            tokens, updated = self.buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate) - 1
+            self.buckets[host] = (tokens, now)
+        return -tokens / self.rate if tokens < 0 else 0.0
+
+    def wait(self, url):
+        delay = self.reserve(url)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    async def wait_async(self, url):
+        delay = self.reserve(url)
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """Process-wide limiter shared by every thread talking to data.egov.kz."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = HostRateLimiter()
+    return _rate_limiter
@@ -0,0 +1,252 @@
+#row_delta.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+from utils.api_utils import METADATA_FIELDS
+from utils.output_formats import DEFAULT_ROW_GROUP_SIZE, dataset_extension, open_dataset_writer
+
+# Columns that identify a row across versions, matched case-insensitively
+KEY_COLUMNS = ('id', '_id')
+LOOKUP_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    dataset_index TEXT PRIMARY KEY,
+    version INTEGER,
+    key_column TEXT,
+    rows INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    dataset_index TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (dataset_index, row_key)
+) WITHOUT ROWID;
+"""
+
+
+def row_digest(record):
+    """12-byte hash of a row's canonical JSON form, ignoring denormalized metadata columns."""
+    canonical = json.dumps(
+        {key: value for key, value in record.items() if key not in METADATA_FIELDS},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str
+    )
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=12).digest()
+
+
+def find_key_column(record):
+    by_lower = {str(column).lower(): column for column in record}
+    for candidate in KEY_COLUMNS:
+        if candidate in by_lower:
+            return by_lower[candidate]
+    return None
+
+
+class RowDeltaTracker:
+    """
+    Compares the rows of a new dataset version with the fingerprints of the previous one.
+
+    Fingerprints (row key -> digest) of every dataset live in one SQLite file. Rows are
+    keyed by their id column when the dataset has one, otherwise by their digest, in
+    which case a changed row shows up as removed + added. Added and changed rows are
+    written as they stream by; removed rows (their keys) are written by finish(), which
+    then replaces the stored fingerprints with the new version's. Re-extracting the
+    version the fingerprints already belong to produces no delta and keeps them as they are.
+    """
+
+    def __init__(self, db_path, dataset_index, version, delta_dir, output_format='csv',
+                 row_group_size=DEFAULT_ROW_GROUP_SIZE, compression='none'):
+        self.dataset_index = dataset_index
+        self.version = version
+        self.output_format = output_format
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute("CREATE TEMP TABLE staging (row_key TEXT PRIMARY KEY, digest BLOB NOT NULL) WITHOUT ROWID")
+
+        previous = self.conn.execute(
+            "SELECT version, key_column FROM datasets WHERE dataset_index = ?", (dataset_index,)
+        ).fetchone()
+        # Without fingerprints of an earlier version there is nothing to diff against
+        self.baseline = previous is None
+        self.previous_version, self.key_column = previous if previous else (None, None)
+        # --force, a --verify mismatch or a Data Link listed twice re-extract the same version
+        self.same_version = previous is not None and self.previous_version == version
+        self.key_decided = not self.baseline
+        self.delta_dir = os.path.join(delta_dir, f"v{self.previous_version}-v{version}")
+        self.writers = {}
+        self.counts = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0}
+        self.rows = 0
+
+    def _writer(self, kind):
+        if kind not in self.writers:
+            os.makedirs(self.delta_dir, exist_ok=True)
+            path = os.path.join(self.delta_dir, f"{kind}{dataset_extension(self.output_format, self.compression)}")
+            self.writers[kind] = open_dataset_writer(path, self.output_format, self.row_group_size, self.compression)
+        return self.writers[kind]
+
+    def _row_key(self, record, digest):
+        if self.key_column is not None and record.get(self.key_column) not in (None, ''):
+            return str(record[self.key_column])
+        return digest.hex()
+
+    def _previous_digests(self, keys):
+        found = {}
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[start:start + LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self.conn.execute(
+                f"SELECT row_key, digest FROM fingerprints WHERE dataset_index = ? AND row_key IN ({placeholders})",
+                (self.dataset_index, *batch)
+            ))
+        return found
+
+    def write_rows(self, records):
+        if self.same_version:
+            return
+        rows = []
+        for record in records:
+            if not isinstance(record, dict):
+                record = {'value': record}
+            if not self.key_decided:
+                self.key_column = find_key_column(record)
+                self.key_decided = True
+            digest = row_digest(record)
+            rows.append((record, self._row_key(record, digest), digest))
+        if not rows:
+            return
+
+        if not self.baseline:
+            previous = self._previous_digests([key for _, key, _ in rows])
+            added, changed = [], []
+            for record, key, digest in rows:
+                old_digest = previous.get(key)
+                if old_digest is None:
+                    added.append(record)
+                elif old_digest != digest:
+                    changed.append(record)
+                else:
+                    self.counts['unchanged'] += 1
+            for kind, kind_rows in (('added', added), ('changed', changed)):
+                if kind_rows:
+                    self._writer(kind).write_rows(kind_rows)
+                    self.counts[kind] += len(kind_rows)
+
+        self.conn.executemany("INSERT OR REPLACE INTO staging VALUES (?, ?)",
+                              [(key, digest) for _, key, digest in rows])
+        self.rows += len(rows)
+
+    def finish(self):
+        """Write the removed keys and the summary, store the new fingerprints; returns the summary."""
+        if self.same_version:
+            self.conn.close()
+            return {
+                'dataset_index': self.dataset_index,
+                'from_version': self.previous_version,
+                'to_version': self.version,
+                'key_column': self.key_column,
+                'baseline': False,
+                'same_version': True,
+                'rows': self.rows,
+                **self.counts
+            }
+
+        if not self.baseline:
+            removed = self.conn.execute(
+                "SELECT f.row_key FROM fingerprints f WHERE f.dataset_index = ? "
+                "AND NOT EXISTS (SELECT 1 FROM staging s WHERE s.row_key = f.row_key)",
+                (self.dataset_index,)
+            )
+            column = self.key_column or 'row_digest'
+            while True:
+                batch = removed.fetchmany(LOOKUP_BATCH)
+                if not batch:
+                    break
+                self._writer('removed').write_rows([{column: row_key} for row_key, in batch])
+                self.counts['removed'] += len(batch)
+            for writer in self.writers.values():
+                writer.close()
+
+        summary = {
+            'dataset_index': self.dataset_index,
+            'from_version': self.previous_version,
+            'to_version': self.version,
+            'key_column': self.key_column,
+            'baseline': self.baseline,
+            'same_version': False,
+            'rows': self.rows,
+            **self.counts
+        }
+        if not self.baseline:
+            os.makedirs(self.delta_dir, exist_ok=True)
+            with open(os.path.join(self.delta_dir, "summary.json"), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("DELETE FROM fingerprints WHERE dataset_index = ?", (self.dataset_index,))
+            self.conn.execute("INSERT INTO fingerprints SELECT ?, row_key, digest FROM staging", (self.dataset_index,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?)",
+                (self.dataset_index, self.version, self.key_column, self.rows, datetime.now().isoformat())
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self.conn.close()
+        return summary
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.abort()
+        self.conn.close()
+
+
+class DeltaWriter:
+    """Dataset writer that also feeds every row to a RowDeltaTracker."""
+
+    def __init__(self, writer, tracker):
+        self.writer = writer
+        self.tracker = tracker
+        self.summary = None
+
+    @property
+    def columns(self):
+        return self.writer.columns
+
+    @property
+    def rows(self):
+        return self.writer.rows
+
+    def write_rows(self, records):
+        self.writer.write_rows(records)
+        self.tracker.write_rows(records)
+
+    def close(self):
+        rows = self.writer.close()
+        self.summary = self.tracker.finish()
+        if self.summary['same_version']:
+            logging.info(f"v{self.summary['to_version']} of {self.summary['dataset_index']} "
+                         f"was already fingerprinted, no delta")
+        elif self.summary['baseline']:
+            logging.info(f"Fingerprinted {rows} rows of {self.summary['dataset_index']} as the delta baseline")
+        else:
+            logging.info(
+                f"Delta v{self.summary['from_version']} -> v{self.summary['to_version']} of "
+                f"{self.summary['dataset_index']}: {self.summary['added']} added, "
+                f"{self.summary['changed']} changed, {self.summary['removed']} removed"
+            )
+        return rows
+
+    def abort(self):
+        self.writer.abort()
+        self.tracker.abort()
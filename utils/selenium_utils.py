@@ -14,6 +14,11 @@ from selenium import webdriver
 import selenium.common.exceptions as sel_exceptions
 from webdriver_manager.chrome import ChromeDriverManager
 
+from config import CHROME_BLOCKED_URLS, CHROME_HEADLESS, CHROME_LEAN
+from utils.page_parser import DatasetPage, parse_dataset_page
+from utils.waits import timed_wait
+
+os.makedirs('logs', exist_ok=True)
 logging.basicConfig(
     filename='logs/scraper.log',
     level=logging.INFO,
@@ -40,15 +45,107 @@ def normalize_filename(name):
         return f"dataset_{int(time.time())}"
 
 
-def restart_chrome():
+_chromedriver_path = None
+
+# Wall-clock spent starting browsers, reported by the driver supervisor
+RESTART_STATS = {'restarts': 0, 'failures': 0, 'seconds': 0.0}
+
+
+def get_chromedriver_path():
+    """Resolve the chromedriver binary once per process (CHROMEDRIVER_PATH overrides the download)."""
+    global _chromedriver_path
+    if _chromedriver_path is None:
+        _chromedriver_path = os.environ.get("CHROMEDRIVER_PATH") or ChromeDriverManager().install()
+    return _chromedriver_path
+
+
+def build_chrome_options(headless=CHROME_HEADLESS, lean=CHROME_LEAN):
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1366,900")
+    if lean:
+        # We only read anchors and td cells, so don't wait for or download anything else
+        options.page_load_strategy = "eager"
+        options.add_argument("--disable-extensions")
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.fonts": 2,
+            "profile.managed_default_content_settings.plugins": 2,
+            "profile.managed_default_content_settings.notifications": 2,
+        })
+    return options
+
+
+def block_page_resources(driver, patterns=CHROME_BLOCKED_URLS):
+    """Block non-document requests (styles, fonts, images, analytics) through CDP."""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+    except Exception as e:
+        logging.warning(f"Could not set blocked URLs: {e}")
+
+
+def restart_chrome(headless=CHROME_HEADLESS, lean=CHROME_LEAN):
     """Restart the Chrome WebDriver."""
+    started = time.monotonic()
     try:
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service)
+        service = Service(get_chromedriver_path())
+        driver = webdriver.Chrome(service=service, options=build_chrome_options(headless, lean))
+        if lean:
+            block_page_resources(driver)
+        RESTART_STATS['restarts'] += 1
         return driver
     except Exception as e:
+        RESTART_STATS['failures'] += 1
         logging.error(f"Failed to restart Chrome: {e}")
         return None
+    finally:
+        RESTART_STATS['seconds'] += time.monotonic() - started
+
+
+# Per page type: number of pages, bytes transferred and load time
+PAGE_LOAD_STATS = {}
+
+PAGE_LOAD_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+return {
+    document_bytes: nav ? nav.transferSize : 0,
+    resource_bytes: resources.reduce((total, r) => total + (r.transferSize || 0), 0),
+    resources: resources.length,
+    load_ms: nav ? (nav.loadEventEnd || nav.domContentLoadedEventEnd) - nav.startTime : 0
+};
+"""
+
+
+def record_page_load(driver, page_type):
+    """Record bytes transferred and load time of the page currently loaded in the driver."""
+    try:
+        timing = driver.execute_script(PAGE_LOAD_SCRIPT) or {}
+    except Exception:
+        return None
+
+    stats = PAGE_LOAD_STATS.setdefault(page_type, {'pages': 0, 'bytes': 0, 'resources': 0, 'load_ms': 0.0})
+    stats['pages'] += 1
+    stats['bytes'] += int(timing.get('document_bytes') or 0) + int(timing.get('resource_bytes') or 0)
+    stats['resources'] += int(timing.get('resources') or 0)
+    stats['load_ms'] += float(timing.get('load_ms') or 0)
+    return timing
+
+
+def page_load_report():
+    lines = []
+    for page_type, stats in sorted(PAGE_LOAD_STATS.items()):
+        pages = stats['pages'] or 1
+        lines.append(
+            f"{page_type}: {stats['pages']} pages, {stats['bytes'] / pages / 1024:.1f} KB/page, "
+            f"{stats['resources'] / pages:.1f} resources/page, {stats['load_ms'] / pages:.0f} ms/page"
+        )
+    return "; ".join(lines)
 
 def ensure_csv_headers(output_csv):
     """Ensure the CSV file has the correct headers"""
@@ -109,68 +206,8 @@ def get_data_link(driver, dataset_url, max_retries=3):
     return None
 
 def extract_base_metadata(driver, dataset_url):
-    metadata = {
-        "Dataset URL": dataset_url if dataset_url else driver.current_url,
-        "Version Name": "",
-        "Version Description": "",
-        "Version Owner": "",
-        "Categories": "",
-        "Keywords": ""
-    }
-
-    try:
-        version_name = driver.find_element(By.ID, "versionName").text.strip()
-        if not version_name:
-            version_name = driver.find_element(
-                By.XPATH, "//td[contains(., 'Наименование')]/following-sibling::td"
-            ).text.strip()
-        metadata["Version Name"] = version_name
-    except:
-        pass
-
-    try:
-        version_desc = driver.find_element(By.ID, "versionDescription").text.strip()
-        if not version_desc:
-            version_desc = driver.find_element(
-                By.XPATH, "//td[contains(., 'Описание')]/following-sibling::td"
-            ).text.strip()
-        metadata["Version Description"] = version_desc
-    except:
-        pass
-
-    try:
-        owner = driver.find_element(By.ID, "versionOwner").text.strip()
-        if not owner:
-            owner = driver.find_element(
-                By.XPATH, "//td[contains(., 'Владелец')]/following-sibling::td"
-            ).text.strip()
-        metadata["Version Owner"] = owner
-    except:
-        pass
-
-    try:
-        keywords = driver.find_element(By.ID, "Keywords").text.strip()
-        if not keywords:
-            keywords = driver.find_element(
-                By.XPATH, "//td[contains(., 'Ключевые слова')]/following-sibling::td"
-            ).text.strip()
-        metadata["Keywords"] = keywords
-    except:
-        pass
-
-    try:
-        categories = driver.find_element(
-            By.XPATH, "//td[contains(., 'Категории')]/following-sibling::td"
-        ).text.strip()
-        if not categories:
-            categories = driver.find_element(
-                By.CSS_SELECTOR, ".dataset-categories"
-            ).text.strip()
-        metadata["Categories"] = categories
-    except:
-        pass
-
-    return metadata
+    page = parse_dataset_page(driver.page_source, dataset_url if dataset_url else driver.current_url)
+    return page.to_base_metadata()
 
 
 def save_to_csv(output_csv, data_dict):
@@ -238,9 +275,7 @@ def download_metadata_from_meta_link(driver, meta_link):
             "User-Agent": "Mozilla/5.0",
             "Accept": "application/json"
         }
-        requests.get(meta_link, headers=headers, timeout=20)
-
-        response = requests.get(meta_link, timeout=10)
+        response = requests.get(meta_link, headers=headers, timeout=20)
         if response.status_code == 200:
             metadata = response.json()
         else:
@@ -255,26 +290,29 @@ def download_metadata_from_meta_link(driver, meta_link):
 
 
 def is_session_valid(driver):
-    """Check if the session is still valid (e.g., by checking the page title)"""
+    """Check if the session is still valid without navigating away from the current page"""
+    if driver is None:
+        return False
     try:
-        driver.get("about:blank")
+        driver.current_url
         return True
-    except:
+    except Exception:
         return False
 
 
 def recover_session(driver, dataset_url):
     """Recover the session by restarting the browser or reloading the page"""
-    driver.quit()
-    driver = restart_chrome()
+    from utils.driver_supervisor import get_supervisor
+    driver = get_supervisor().restart("session lost")
     if driver:
         driver.get(dataset_url)
     return driver
 
 
 def refresh_driver():
-    """Refresh the driver session"""
-    return restart_chrome()
+    """Refresh the driver session, quitting the browser it replaces"""
+    from utils.driver_supervisor import get_supervisor
+    return get_supervisor().restart("refresh")
 
 
 from selenium.webdriver.common.by import By
@@ -338,7 +376,13 @@ def output_csv(csv_path, version_name, data_link):
 
 def extract_metadata_link_and_version(driver, dataset_url):
     driver.get(dataset_url)
-    time.sleep(2)  # Add wait if needed
+    with timed_wait('view_ready'):
+        try:
+            WebDriverWait(driver, 10, poll_frequency=0.1).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "#metaLink a"))
+            )
+        except sel_exceptions.TimeoutException:
+            pass
 
     try:
         meta_td = driver.find_element(By.ID, "metaLink")
@@ -354,7 +398,19 @@ def extract_metadata_link_and_version(driver, dataset_url):
 
     return meta_link, version_name
 
+def save_proxy_metadata(page):
+    """Proxy-only datasets have no meta link, so keep what the view page tells us."""
+    os.makedirs("results/metadata/", exist_ok=True)
+    file_path = os.path.join("results/metadata/", f"{normalize_filename(page.version_name)}.json")
+    metadata = page.to_metadata()
+    metadata.update(page.to_base_metadata())
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    print(f"✅ Fallback metadata saved for proxy-only dataset: {file_path}")
+
+
 def extract_metadata_with_recovery(driver, dataset_link, max_retries=3):
+    """Load a dataset view page once and parse it; returns (DatasetPage, driver)."""
     retries = 0
     while retries < max_retries:
         try:
@@ -365,124 +421,82 @@ def extract_metadata_with_recovery(driver, dataset_link, max_retries=3):
                 driver = new_driver
 
             driver.get(dataset_link)
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "table.dataset-details, #versionName"))
-            )
-
-            metadata = {}
-            metadata["Dataset URL"] = dataset_link
-            # Version Name
-            version_name = f"dataset_{int(time.time())}"
             try:
-                version_name = driver.find_element(By.ID, 'versionName').text.strip()
-                if not version_name:
-                    version_name = driver.find_element(By.CSS_SELECTOR, 'h1.dataset-title').text.strip()
-            except sel_exceptions.NoSuchElementException:
-                pass
-            metadata["Version Name"] = version_name
-            print(f"Version Name: {version_name}")
-
-            # Data Link
-            # Data Link with multiple fallbacks
-            data_link = ""
-            try:
-                # Primary: v4 API format
-                data_link_element = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, '//a[contains(@href, "api/v4/")]'))
-                )
-                data_link = data_link_element.get_attribute("href")
-            except (sel_exceptions.NoSuchElementException, sel_exceptions.TimeoutException):
-                try:
-                    # Fallback: proxy format
-                    data_link_element = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located(
-                            (By.XPATH, '//a[contains(@href, "/proxy/")]')
-                        )
+                with timed_wait('view_ready'):
+                    WebDriverWait(driver, 15, poll_frequency=0.1).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, "table.dataset-details, #versionName"))
                     )
-                    data_link = data_link_element.get_attribute("href")
-                    metadata["Data Link"] = data_link
-                    print(f"Proxy Data Link: {data_link}")
-
-                    # Enrich with base metadata
-                    base_metadata = extract_base_metadata(driver, dataset_url=dataset_link)
-                    metadata.update(base_metadata)
-
-                    # Save base metadata to JSON
-                    os.makedirs("results/metadata/", exist_ok=True)
-                    file_path = os.path.join("results/metadata/", f"{normalize_filename(version_name)}.json")
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        json.dump(metadata, f, indent=2, ensure_ascii=False)
-                    print(f"✅ Fallback metadata saved for proxy-only dataset: {file_path}")
-
-                except (sel_exceptions.NoSuchElementException, sel_exceptions.TimeoutException):
-                    data_link = ""
-
-            metadata["Data Link"] = data_link
-            if data_link:
-                print(f"Data Link: {data_link}")
+            except sel_exceptions.TimeoutException:
+                # Parse whatever arrived; the links may be there even without the details table
+                logging.warning(f"Details table not found on {dataset_link}")
+            record_page_load(driver, "view")
+
+            page = parse_dataset_page(driver.page_source, dataset_link)
+            if not page.version_name:
+                page.version_name = f"dataset_{int(time.time())}"
+            print(f"Version Name: {page.version_name}")
+
+            if page.data_link:
+                print(f"{'Proxy ' if page.is_proxy else ''}Data Link: {page.data_link}")
+                if page.is_proxy:
+                    save_proxy_metadata(page)
             else:
                 print("⚠️ Data Link not found (even with fallback)")
 
-            # Meta Link
-            meta_link = ""
-            try:
-                meta_td = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, 'td#metaLink a, a.meta-link'))
-                )
-                meta_link = meta_td.get_attribute("href")
-            except (sel_exceptions.NoSuchElementException, sel_exceptions.TimeoutException):
-                pass
-            metadata["Meta Link"] = meta_link
-            if meta_link:
-                print(f"Meta Link: {meta_link}")
+            if page.meta_link:
+                print(f"Meta Link: {page.meta_link}")
             else:
                 print("⚠️ Meta Link not found")
 
-            return metadata, driver
+            return page, driver
 
         except sel_exceptions.WebDriverException as e:
             print(f"❌ Failed to extract metadata from {dataset_link}: {e}")
+            retries += 1
             new_driver = recover_session(driver, dataset_link)
             if new_driver:
                 driver = new_driver
                 print("🔁 Recovered ChromeDriver session, retrying metadata extraction...")
-                continue  # ← Retry the same attempt without increasing retry count
+                continue
             else:
                 break  # Unable to recover, exit the loop
 
-    return {
-        "Version Name": f"dataset_{int(time.time())}",
-        "Data Link": "",
-        "Meta Link": ""
-    }, driver
+    return DatasetPage(dataset_url=dataset_link, version_name=f"dataset_{int(time.time())}"), driver
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 
-def bypass_captcha_if_present(driver):
+def bypass_captcha_if_present(driver, timeout=0):
+    """Dismiss the CAPTCHA modal if it is on the page; only waits for it when timeout is given."""
     try:
-        # Wait briefly for CAPTCHA modal
-        WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.ID, "captchaSuccess"))
-        )
-        print("🛡️ CAPTCHA modal detected — attempting to bypass")
+        with timed_wait('captcha'):
+            if timeout:
+                WebDriverWait(driver, timeout).until(
+                    EC.presence_of_element_located((By.ID, "captchaSuccess"))
+                )
+            buttons = driver.find_elements(By.ID, "captchaSuccess")
+            if not buttons:
+                return False
+            print("🛡️ CAPTCHA modal detected — attempting to bypass")
 
-        # Click CAPTCHA checkbox if it's a custom checkbox
-        try:
-            checkbox = driver.find_element(By.CSS_SELECTOR, 'input[type="checkbox"]')
-            if not checkbox.is_selected():
-                checkbox.click()
-                print("✅ CAPTCHA checkbox clicked")
-        except Exception:
-            pass  # Maybe it's not needed or already checked
-
-        # Click the "Готово" button to dismiss the modal
-        button = driver.find_element(By.ID, "captchaSuccess")
-        button.click()
-        print("✅ CAPTCHA dismissed successfully")
-        time.sleep(2)
+            # Click CAPTCHA checkbox if it's a custom checkbox
+            try:
+                checkbox = driver.find_element(By.CSS_SELECTOR, 'input[type="checkbox"]')
+                if not checkbox.is_selected():
+                    checkbox.click()
+                    print("✅ CAPTCHA checkbox clicked")
+            except Exception:
+                pass  # Maybe it's not needed or already checked
+
+            # Click the "Готово" button to dismiss the modal
+            buttons[0].click()
+            WebDriverWait(driver, 5, poll_frequency=0.1).until(
+                EC.invisibility_of_element_located((By.ID, "captchaSuccess"))
+            )
+            print("✅ CAPTCHA dismissed successfully")
+            return True
     except Exception:
-        pass  # CAPTCHA modal didn't appear
+        return False  # CAPTCHA modal didn't appear or didn't go away
 
 
 def get_dataset_links(driver, base_url, gov_agency_id, output_csv, metadata_dir, max_retries=3):
@@ -534,8 +548,9 @@ def get_dataset_links(driver, base_url, gov_agency_id, output_csv, metadata_dir,
             dataset_url = base_url + dataset_relative_url
             print(f"Processing dataset: {dataset_url}")
             try:
-                metadata = extract_metadata_with_recovery(driver, dataset_url)
-                meta_link = metadata.get("Meta Link", "")
+                page, driver = extract_metadata_with_recovery(driver, dataset_url)
+                metadata = page.to_metadata()
+                meta_link = page.meta_link
 
                 if meta_link:
                     metadata = download_metadata_from_meta_link(driver, meta_link)
@@ -0,0 +1,84 @@
+#waits.py
+import time
+from contextlib import contextmanager
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from config import CRAWL_DELAY_SECONDS, CRAWL_DELAY_MIN, CRAWL_DELAY_MAX
+
+# Wait type -> number of waits and wall-clock seconds spent in them
+WAIT_STATS = {}
+
+# Resolves as soon as the search page shows datasets or a CAPTCHA. With the eager load strategy
+# scripts may still inject either after parsing, so 'empty' needs the load event plus a quiet
+# period of EMPTY_SETTLE_MS in which neither appeared (the marker lives on the page's window).
+EMPTY_SETTLE_MS = 750
+SEARCH_PAGE_STATE_SCRIPT = """
+if (document.getElementById('captchaSuccess')) return 'captcha';
+if (document.querySelector('a[href^="/datasets/view?index="]')) return 'datasets';
+if (document.readyState !== 'complete') return null;
+if (!window.__emptySince) window.__emptySince = Date.now();
+return Date.now() - window.__emptySince >= %d ? 'empty' : null;
+""" % EMPTY_SETTLE_MS
+
+
+@contextmanager
+def timed_wait(wait_type):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        stats = WAIT_STATS.setdefault(wait_type, {'count': 0, 'seconds': 0.0})
+        stats['count'] += 1
+        stats['seconds'] += time.monotonic() - started
+
+
+def wait_for_search_page(driver, timeout=15):
+    """Wait until a search page is readable; returns 'datasets', 'captcha', 'empty' or 'timeout'."""
+    with timed_wait('search_ready'):
+        try:
+            return WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+                lambda d: d.execute_script(SEARCH_PAGE_STATE_SCRIPT)
+            )
+        except TimeoutException:
+            return 'timeout'
+
+
+def wait_report():
+    return ", ".join(
+        f"{wait_type}: {stats['seconds']:.1f}s over {stats['count']}"
+        for wait_type, stats in sorted(WAIT_STATS.items())
+    )
+
+
+class PolitenessDelay:
+    """Delay between requests that shrinks while the site answers and grows on CAPTCHAs and errors."""
+
+    def __init__(self, delay=CRAWL_DELAY_SECONDS, minimum=CRAWL_DELAY_MIN, maximum=CRAWL_DELAY_MAX):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.delay = min(max(delay, minimum), maximum)
+
+    def success(self):
+        self.delay = max(self.minimum, self.delay * 0.8)
+
+    def backoff(self):
+        self.delay = min(self.maximum, max(self.delay, self.minimum, 0.5) * 2)
+
+    def sleep(self, wait_type='politeness'):
+        if self.delay <= 0:
+            return
+        with timed_wait(wait_type):
+            time.sleep(self.delay)
+
+
+_politeness = None
+
+
+def get_politeness():
+    """Per-process politeness delay shared by the HTTP and browser crawl paths."""
+    global _politeness
+    if _politeness is None:
+        _politeness = PolitenessDelay()
+    return _politeness